@@ -3,31 +3,51 @@
 新架构主应用 - 单入口对话+意图路由+多Ops-Skills
 """
 import os
-import json
+import re
+import logging
 import time
+import gzip
+import hashlib
 import asyncio
 from datetime import datetime, timedelta
-from collections import defaultdict, Counter
-from typing import List, Dict, Any, AsyncGenerator
-from fastapi import FastAPI, Request, Body, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
+from collections import defaultdict, deque
+from typing import List, Dict, Any, AsyncGenerator, Set, Optional
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi.requests import HTTPConnection
+from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse, Response, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import orjson
 from pathlib import Path
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # 导入新架构组件
-from src.core.router.intent_router import IntentRouter, SkillType, route_query
+from src.core.router.intent_router import SkillType, route_query
+from src.core.skills.base_skill import BaseSkill
 from src.core.skills.process_skill import ProcessSkill
 from src.core.skills.contact_skill import ContactSkill
 from src.core.skills.course_skill import CourseSkill
 from src.core.skills.greeting_skill import GreetingSkill
 from src.core.rag.qwen_stream_integration import QwenStreamLLM
+from src.core.cache.response_cache import ResponseCache
+from src.core.stats.hyperloglog import HyperLogLog
+from src.core.stats.space_saving import SpaceSaving
+from src.config.logging_config import setup_logging
+
+# 日志经队列交给后台线程写出，请求处理中不再同步写stdout
+setup_logging(os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 
-# 创建应用
+# 创建应用 (JSON响应使用 orjson 序列化)
 app = FastAPI(
     title="校园智能助手",
     version="2.0.0",
-    description="基于意图路由的多域智能助手系统"
+    description="基于意图路由的多域智能助手系统",
+    default_response_class=ORJSONResponse
 )
 
 # 添加CORS中间件
@@ -40,79 +60,137 @@ app.add_middleware(
 )
 
 # 初始化组件
-intent_router = IntentRouter()
 qwen_llm = QwenStreamLLM()
 
+# 技能的中文显示名称
+SKILL_DISPLAY_NAMES = {
+    SkillType.PROCESS: "办事流程助手",
+    SkillType.CONTACT: "联系人助手", 
+    SkillType.COURSE: "课程学习助手",
+    SkillType.POLICY: "政策条款助手",
+    SkillType.GREETING: "通用对话助手",
+    SkillType.UNKNOWN: "未知技能"
+}
+
 def get_skill_display_name(skill_type):
     """获取技能的中文显示名称"""
-    skill_names = {
-        SkillType.PROCESS: "办事流程助手",
-        SkillType.CONTACT: "联系人助手", 
-        SkillType.COURSE: "课程学习助手",
-        SkillType.POLICY: "政策条款助手",
-        SkillType.GREETING: "通用对话助手",
-        SkillType.UNKNOWN: "未知技能"
-    }
-    return skill_names.get(skill_type, "处理中")
-
-# 初始化Skills
-skills = {
-    SkillType.PROCESS: ProcessSkill(),
-    SkillType.CONTACT: ContactSkill(),
-    SkillType.COURSE: CourseSkill(),
-    SkillType.GREETING: GreetingSkill(),
+    return SKILL_DISPLAY_NAMES.get(skill_type, "处理中")
+
+# Skills工厂 (首次用到某个技能时才创建实例并加载其知识库)
+SKILL_FACTORIES = {
+    SkillType.PROCESS: ProcessSkill,
+    SkillType.CONTACT: ContactSkill,
+    SkillType.COURSE: CourseSkill,
+    SkillType.GREETING: GreetingSkill,
     # TODO: 后续添加 PolicySkill
 }
+# 已创建的技能实例
+skills: Dict[SkillType, BaseSkill] = {}
+
+def get_skill(skill_type: SkillType) -> Optional[BaseSkill]:
+    """获取技能实例，首次使用时创建；没有对应技能时返回None"""
+    skill = skills.get(skill_type)
+    if skill is None:
+        factory = SKILL_FACTORIES.get(skill_type)
+        if factory is None:
+            return None
+        skill = skills[skill_type] = factory()
+        # 技能知识变化后，缓存中基于旧知识的回答不再可用
+        skill.on_knowledge_changed = router_result_cache.clear
+    return skill
+
+# 技能类型 -> 统计用的字符串值 (每次查询直接查表)
+SKILL_VALUE = {skill_type: skill_type.value for skill_type in SkillType}
+# 技能显示名称 -> 统计用的字符串值 (从处理结果反查命中的技能)
+SKILL_VALUE_BY_DISPLAY_NAME = {name: SKILL_VALUE[skill_type] for skill_type, name in SKILL_DISPLAY_NAMES.items()}
 
 # ==================== 访问统计功能 ====================
 access_stats = {
     "total_visits": 0,
     "daily_visits": defaultdict(int),
     "hourly_visits": defaultdict(int),
-    "unique_ips": set(),
+    "unique_ips": HyperLogLog(),  # 独立IP数估计 (固定内存，不随访客数增长)
     "endpoint_stats": defaultdict(int),
-    "user_agents": Counter(),
+    "user_agents": SpaceSaving(k=64),  # 常见User-Agent (固定64个计数槽，不随UA种类增长)
+    "recent_days": deque(maxlen=7),  # 最近有访问的7天 (按日期先后)
+    "week_start": None,              # 本周一的日期
+    "week_visits": 0,                # 本周访问量 (随访问累加，每天首次访问时按需重算)
     "skill_usage": defaultdict(int),
     "intent_accuracy": defaultdict(float),
     "last_reset": datetime.now().date()
 }
 
+def get_client_ip(conn: HTTPConnection) -> str:
+    """获取客户端IP (优先取 X-Forwarded-For 第一项)，结果缓存在 conn.state 上"""
+    client_ip = getattr(conn.state, "client_ip", None)
+    if client_ip is not None:
+        return client_ip
+    
+    xff = conn.headers.get('x-forwarded-for')
+    if xff:
+        comma = xff.find(',')
+        client_ip = (xff[:comma] if comma >= 0 else xff).strip()
+    else:
+        client_ip = conn.client.host if conn.client else "unknown"
+    
+    conn.state.client_ip = client_ip
+    return client_ip
+
 def record_visit(request: Request, endpoint: str = "", skill_used: str = None):
     """记录访问统计"""
     global access_stats
     
     # 获取客户端IP
-    client_ip = request.client.host
-    if hasattr(request, 'headers') and 'x-forwarded-for' in request.headers:
-        client_ip = request.headers['x-forwarded-for'].split(',')[0].strip()
+    client_ip = get_client_ip(request)
     
     # 获取User-Agent
     user_agent = request.headers.get('user-agent', 'Unknown')
     
+    # 清理旧数据（保留最近30天）- 只在每天第一次访问时执行，其余请求无需遍历
+    now = datetime.now()
+    today = now.date()
+    daily_visits = access_stats["daily_visits"]
+    if today not in daily_visits:
+        cutoff_date = today - timedelta(days=30)
+        for d in [d for d in daily_visits if d < cutoff_date]:
+            del daily_visits[d]
+        
+        # 新的一天：滚动最近7天列表，跨周时重算本周访问量
+        access_stats["recent_days"].append(today)
+        week_start = today - timedelta(days=today.weekday())
+        if week_start != access_stats["week_start"]:
+            access_stats["week_start"] = week_start
+            access_stats["week_visits"] = sum(v for d, v in daily_visits.items() if d >= week_start)
+    
     # 记录统计
     access_stats["total_visits"] += 1
-    access_stats["daily_visits"][datetime.now().date()] += 1
-    access_stats["hourly_visits"][datetime.now().hour] += 1
+    daily_visits[today] += 1
+    access_stats["week_visits"] += 1
+    access_stats["hourly_visits"][now.hour] += 1
     access_stats["unique_ips"].add(client_ip)
     access_stats["endpoint_stats"][endpoint] += 1
-    access_stats["user_agents"][user_agent] += 1
+    access_stats["user_agents"].add(user_agent)
     
     if skill_used:
         access_stats["skill_usage"][skill_used] += 1
     
-    # 清理旧数据（保留最近30天）
-    cutoff_date = datetime.now().date() - timedelta(days=30)
-    access_stats["daily_visits"] = {
-        d: v for d, v in access_stats["daily_visits"].items() 
-        if d >= cutoff_date
-    }
-    
     # 打印访问日志
-    print(f"📊 访问统计: {endpoint} | IP: {client_ip} | 技能: {skill_used} | 总访问: {access_stats['total_visits']}")
+    logger.info("📊 访问统计: %s | IP: %s | 技能: %s | 总访问: %s", endpoint, client_ip, skill_used, access_stats['total_visits'])
+
+async def record_visit_after_response(request: Request, endpoint: str):
+    """响应发送后再记录访问统计
+
+    供 BackgroundTasks 使用：协程在事件循环中执行，同步函数则会被放到线程池，
+    与请求处理中对 access_stats 的修改产生竞争。
+    """
+    record_visit(request, endpoint)
 
 # ==================== 访问控制功能 ====================
 rate_limit = {
-    "requests": defaultdict(list),
+    "requests": defaultdict(deque),
+    "recent_requests": defaultdict(deque),
+    "checks": 0,
+    "sweep_interval": 1000,
     "max_requests_per_minute": 60,
     "max_requests_per_hour": 1000,
     "blocked_ips": set(),
@@ -134,87 +212,173 @@ def check_rate_limit(client_ip: str) -> bool:
     
     current_time = time.time()
     
-    # 清理旧的时间戳
-    rate_limit["requests"][client_ip] = [
-        ts for ts in rate_limit["requests"][client_ip] 
-        if current_time - ts < 3600
-    ]
+    # 每隔一定次数清理长时间没有请求的IP，避免字典无限增长
+    rate_limit["checks"] += 1
+    if rate_limit["checks"] % rate_limit["sweep_interval"] == 0:
+        stale_ips = [
+            ip for ip, timestamps in rate_limit["requests"].items()
+            if not timestamps or current_time - timestamps[-1] >= 3600
+        ]
+        for ip in stale_ips:
+            del rate_limit["requests"][ip]
+            rate_limit["recent_requests"].pop(ip, None)
+    
+    # 清理旧的时间戳（超过1小时）- 时间戳按先后顺序追加，过期的总在队首
+    hour_requests = rate_limit["requests"][client_ip]
+    while hour_requests and current_time - hour_requests[0] >= 3600:
+        hour_requests.popleft()
     
     # 检查每小时限制
-    if len(rate_limit["requests"][client_ip]) >= rate_limit["max_requests_per_hour"]:
+    if len(hour_requests) >= rate_limit["max_requests_per_hour"]:
         rate_limit["blocked_ips"].add(client_ip)
-        print(f"🚫 IP {client_ip} 因超过每小时限制被阻止")
+        logger.warning("🚫 IP %s 因超过每小时限制被阻止", client_ip)
         return False
     
-    # 检查每分钟限制
-    recent_requests = [
-        ts for ts in rate_limit["requests"][client_ip] 
-        if current_time - ts < 60
-    ]
+    # 检查每分钟限制 (单独维护最近1分钟的时间戳，无需再次遍历)
+    minute_requests = rate_limit["recent_requests"][client_ip]
+    while minute_requests and current_time - minute_requests[0] >= 60:
+        minute_requests.popleft()
     
-    if len(recent_requests) >= rate_limit["max_requests_per_minute"]:
-        print(f"⚠️ IP {client_ip} 超过每分钟限制，但未阻止")
-        return True
+    if len(minute_requests) >= rate_limit["max_requests_per_minute"]:
+        logger.warning("⚠️ IP %s 超过每分钟限制，但未阻止", client_ip)
+        return True  # 暂时允许，但记录警告
     
     # 记录当前请求
-    rate_limit["requests"][client_ip].append(current_time)
+    hour_requests.append(current_time)
+    minute_requests.append(current_time)
     return True
 
 # 连接管理器
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # 集合存储，连接关闭时 O(1) 移除
+        self.active_connections: Set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
 
     async def send_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
+    async def send_json(self, data: Dict[str, Any], websocket: WebSocket):
+        """orjson序列化后以文本帧发送 (前端按文本解析JSON)"""
+        await websocket.send_text(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode())
+
+    async def send_many(self, messages: List[Dict[str, Any]], websocket: WebSocket, jsonl: bool):
+        """发送多条消息：客户端支持时合并为一个文本帧 (每行一条JSON)，否则逐条发送"""
+        if not jsonl:
+            for data in messages:
+                await self.send_json(data, websocket)
+            return
+        
+        await websocket.send_text(b"\n".join(
+            orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) for data in messages
+        ).decode())
+
 manager = ConnectionManager()
 
+# 固定内容的WebSocket错误消息 (启动时序列化一次)
+WS_ERROR_EMPTY_QUESTION = orjson.dumps({"type": "error", "message": "问题不能为空"}).decode()
+WS_ERROR_TOO_LONG = orjson.dumps({"type": "error", "message": "问题长度不能超过500字符"}).decode()
+WS_ERROR_UNSAFE_INPUT = orjson.dumps({"type": "error", "message": "输入包含不安全内容，请重新输入"}).decode()
+WS_ERROR_SERVER = orjson.dumps({"type": "error", "content": "服务器处理请求时出错，请刷新页面重试"}).decode()
+
+# 恶意输入检测规则 (合并为一个忽略大小写的正则，一次扫描完成检测)
+DANGEROUS_PATTERNS = ['<script', 'javascript:', 'eval(', 'exec(', 'import os', 'subprocess']
+DANGEROUS_INPUT_RE = re.compile("|".join(map(re.escape, DANGEROUS_PATTERNS)), re.IGNORECASE)
+
 # ==================== 核心路由逻辑 ====================
+class RouterResultCache(ResponseCache):
+    """路由结果缓存 - 按去除首尾空白后的原问题匹配
+
+    兜底回复会引用用户原话，大小写不同的问题不能共用同一条回答。
+    """
+    
+    @staticmethod
+    def make_key(question: str) -> str:
+        return question.strip()
+
+# 相同问题的处理结果缓存 (快捷按钮等重复问题在5分钟内直接复用)
+router_result_cache = RouterResultCache(max_size=1024, ttl=300)
+# 正在处理中的问题 -> 处理任务，同时到达的相同问题共用一次处理
+pending_router_queries: Dict[str, asyncio.Task] = {}
+
 async def process_query_with_router(query: str) -> Dict[str, Any]:
+    """使用意图路由器处理查询 - 优先复用缓存或进行中的相同查询"""
+    cached = router_result_cache.get(query)
+    if cached is not None:
+        logger.info("⚡ 命中路由结果缓存: %s", query)
+        record_skill_usage(cached)
+        return cached
+    
+    key = router_result_cache.make_key(query)
+    task = pending_router_queries.get(key)
+    if task is None:
+        task = asyncio.create_task(route_and_process_query(query))
+        pending_router_queries[key] = task
+        task.add_done_callback(lambda done: finish_router_query(key, query, done))
+    
+    # shield: 某个连接断开时不取消其他连接也在等待的处理任务
+    result = await asyncio.shield(task)
+    record_skill_usage(result)
+    return result
+
+def record_skill_usage(result: Dict[str, Any]):
+    """记录技能使用统计 - 每次查询计一次，缓存命中和共用处理任务的查询同样计入"""
+    skill_value = SKILL_VALUE_BY_DISPLAY_NAME.get(result.get("skill_used"))
+    if skill_value is not None:
+        access_stats["skill_usage"][skill_value] += 1
+        access_stats["intent_accuracy"][skill_value] = result["intent_confidence"]
+
+def finish_router_query(key: str, query: str, task: asyncio.Task):
+    """处理任务完成后移出进行中列表，成功的结果写入缓存"""
+    pending_router_queries.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+    
+    result = task.result()
+    if result.get("success"):
+        router_result_cache.set(query, result)
+
+async def route_and_process_query(query: str) -> Dict[str, Any]:
     """使用意图路由器处理查询"""
     try:
         # 1. 意图识别
         intent_result = route_query(query)
-        print(f"🎯 意图识别: {intent_result.skill.value} (置信度: {intent_result.confidence:.2f})")
+        skill_type = intent_result.skill
+        skill_value = SKILL_VALUE[skill_type]
+        logger.info("🎯 意图识别: %s (置信度: %.2f)", skill_value, intent_result.confidence)
         
         # 2. 路由到对应Skill
-        if intent_result.skill in skills:
-            skill = skills[intent_result.skill]
+        skill = get_skill(skill_type)
+        if skill is not None:
             skill_result = await skill.process_query(
                 query, 
                 intent_result.entities, 
                 intent_result.filters
             )
             
-            # 记录技能使用统计
-            access_stats["skill_usage"][intent_result.skill.value] += 1
-            access_stats["intent_accuracy"][intent_result.skill.value] = intent_result.confidence
-            
             return {
                 "success": skill_result.success,
                 "content": skill_result.content,
                 "sources": skill_result.sources,
                 "confidence": skill_result.confidence,
-                "skill_used": get_skill_display_name(intent_result.skill),
+                "skill_used": get_skill_display_name(skill_type),
                 "intent_confidence": intent_result.confidence,
                 "entities": intent_result.entities,
                 "metadata": skill_result.metadata
             }
         else:
             # 3. 兜底处理 - 使用通用LLM
-            print(f"⚠️ 未找到对应技能，使用通用LLM处理")
+            logger.warning("⚠️ 未找到对应技能，使用通用LLM处理")
             return await fallback_to_llm(query, intent_result)
             
     except Exception as e:
-        print(f"❌ 路由处理出错: {e}")
+        logger.error("❌ 路由处理出错: %s", e)
         return {
             "success": False,
             "content": f"处理查询时出错: {str(e)}",
@@ -231,7 +395,7 @@ async def fallback_to_llm(query: str, intent_result) -> Dict[str, Any]:
     try:
         # 构建通用上下文
         context = f"用户查询: {query}\n"
-        context += f"识别意图: {intent_result.skill.value}\n"
+        context += f"识别意图: {SKILL_VALUE[intent_result.skill]}\n"
         context += f"置信度: {intent_result.confidence}\n"
         context += f"实体: {intent_result.entities}\n"
         
@@ -260,26 +424,24 @@ async def fallback_to_llm(query: str, intent_result) -> Dict[str, Any]:
             "metadata": {"error": str(e)}
         }
 
+# 兜底回复的关键词 (在小写后的查询上匹配，启动时编译一次)
+GREETING_RE = re.compile("你好|hello|hi|嗨")
+THANKS_RE = re.compile("谢谢|感谢|thank")
+REIMBURSEMENT_RE = re.compile("报销|医疗|医药费")
+CONTACT_RE = re.compile("常春艳|医保办|报销")
+FURTHER_STUDY_RE = re.compile("保研|考研|留学|升学")
+CS_MAJOR_RE = re.compile("cs|计算机|专业|方向")
+
 def generate_intelligent_response(query: str, intent_result) -> str:
     """生成智能回复"""
-    query_lower = query.lower()
-    skill_type = intent_result.skill.value
-    
     # 根据意图类型生成相应回复
-    if skill_type == "greeting":
-        return generate_greeting_response(query)
-    elif skill_type == "process":
-        return generate_process_response(query)
-    elif skill_type == "contact":
-        return generate_contact_response(query)
-    elif skill_type == "course":
-        return generate_course_response(query)
-    else:
-        return generate_general_response(query)
+    generate = RESPONSE_GENERATORS.get(intent_result.skill, generate_general_response)
+    return generate(query)
 
 def generate_greeting_response(query: str) -> str:
     """生成问候回复"""
-    if any(word in query.lower() for word in ['你好', 'hello', 'hi', '嗨']):
+    query_lower = query.lower()
+    if GREETING_RE.search(query_lower):
         return """👋 **通用对话助手**为您服务！
 
 您好！我是校园智能助手，很高兴为您服务！
@@ -291,7 +453,7 @@ def generate_greeting_response(query: str) -> str:
 - 💬 **日常对话** - 聊天交流、问题解答
 
 请告诉我您需要什么帮助，我会尽力为您提供准确的信息！"""
-    elif any(word in query.lower() for word in ['谢谢', '感谢', 'thank']):
+    elif THANKS_RE.search(query_lower):
         return """😊 **通用对话助手**为您服务！
 
 不客气！很高兴能帮助到您！
@@ -308,7 +470,8 @@ def generate_greeting_response(query: str) -> str:
 
 def generate_process_response(query: str) -> str:
     """生成办事流程回复"""
-    if any(word in query.lower() for word in ['报销', '医疗', '医药费']):
+    query_lower = query.lower()
+    if REIMBURSEMENT_RE.search(query_lower):
         return """🏥 **办事流程助手**为您服务！
 
 关于医疗报销，我为您整理了以下信息：
@@ -344,7 +507,8 @@ def generate_process_response(query: str) -> str:
 
 def generate_contact_response(query: str) -> str:
     """生成联系人回复"""
-    if any(word in query.lower() for word in ['常春艳', '医保办', '报销']):
+    query_lower = query.lower()
+    if CONTACT_RE.search(query_lower):
         return """📞 **联系人助手**为您服务！
 
 关于老师信息，我为您整理了以下联系方式：
@@ -373,7 +537,8 @@ def generate_contact_response(query: str) -> str:
 
 def generate_course_response(query: str) -> str:
     """生成课程学习回复"""
-    if any(word in query.lower() for word in ['保研', '考研', '留学', '升学']):
+    query_lower = query.lower()
+    if FURTHER_STUDY_RE.search(query_lower):
         return """🎓 **课程学习助手**为您服务！
 
 关于升学规划，我为您整理了以下指导信息：
@@ -395,7 +560,7 @@ def generate_course_response(query: str) -> str:
 📚 *来源: 职业规划知识库*
 
 **建议**：根据个人情况综合考虑，选择最适合的发展路径。"""
-    elif any(word in query.lower() for word in ['cs', '计算机', '专业', '方向']):
+    elif CS_MAJOR_RE.search(query_lower):
         return """🎓 **课程学习助手**为您服务！
 
 关于CS专业发展，我为您整理了以下指导：
@@ -443,665 +608,154 @@ def generate_general_response(query: str) -> str:
 
 请告诉我您具体需要什么帮助？"""
 
+# 各意图对应的兜底回复生成函数 (未列出的意图使用通用回复)
+RESPONSE_GENERATORS = {
+    SkillType.GREETING: generate_greeting_response,
+    SkillType.PROCESS: generate_process_response,
+    SkillType.CONTACT: generate_contact_response,
+    SkillType.COURSE: generate_course_response,
+}
+
 # ==================== API端点 ====================
 @app.get("/")
-async def root(request: Request):
+async def root(request: Request, background_tasks: BackgroundTasks):
     """根路径 - 自动重定向到Web界面"""
-    record_visit(request, "/")
+    background_tasks.add_task(record_visit_after_response, request, "/")
     return RedirectResponse(url="/web", status_code=302)
 
 @app.get("/web", response_class=HTMLResponse)
-async def web_interface(request: Request):
+async def web_interface(request: Request, background_tasks: BackgroundTasks):
     """Web界面 - 重定向到新的统一对话界面"""
-    record_visit(request, "/web")
+    background_tasks.add_task(record_visit_after_response, request, "/web")
     return RedirectResponse(url="/ask", status_code=302)
 
+# 统一对话界面页面 (启动时读取为字节并计算ETag，请求时直接返回)
+ASK_HTML_PATH = Path(__file__).parent / "src" / "web" / "static" / "ask.html"
+ASK_HTML_BYTES = ASK_HTML_PATH.read_bytes()
+ASK_HTML_GZIP = gzip.compress(ASK_HTML_BYTES, compresslevel=9)
+ASK_HTML_BR = brotli.compress(ASK_HTML_BYTES, quality=11) if brotli else None
+ASK_HTML_ETAG = '"' + hashlib.md5(ASK_HTML_BYTES).hexdigest() + '"'
+
 @app.get("/ask", response_class=HTMLResponse)
-async def ask_interface(request: Request):
+async def ask_interface(request: Request, background_tasks: BackgroundTasks):
     """新的统一对话界面"""
-    record_visit(request, "/ask")
-    return """
-    <!DOCTYPE html>
-    <html lang="zh-CN">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>校园智能助手</title>
-        <script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
-        <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/highlight.js@11.7.0/styles/github.css">
-        <script src="https://cdn.jsdelivr.net/npm/highlight.js@11.7.0/lib/highlight.min.js"></script>
-        <style>
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }
-            
-            body {
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            
-            .container {
-                background: white;
-                border-radius: 20px;
-                box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-                width: 90%;
-                max-width: 900px;
-                max-height: 90vh;
-                display: flex;
-                flex-direction: column;
-                overflow: hidden;
-            }
-            
-            .header {
-                background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-                color: white;
-                padding: 20px;
-                text-align: center;
-            }
-            
-            .header h1 {
-                font-size: 24px;
-                margin-bottom: 5px;
-            }
-            
-            .header p {
-                opacity: 0.9;
-                font-size: 14px;
-            }
-            
-            .skill-indicator {
-                background: rgba(255,255,255,0.2);
-                padding: 5px 10px;
-                border-radius: 15px;
-                font-size: 12px;
-                margin-top: 10px;
-                display: inline-block;
-            }
-            
-            .chat-container {
-                flex: 1;
-                display: flex;
-                flex-direction: column;
-                min-height: 400px;
-            }
-            
-            .messages {
-                flex: 1;
-                padding: 20px;
-                overflow-y: auto;
-                max-height: 400px;
-            }
-            
-            .message {
-                margin-bottom: 15px;
-                display: flex;
-                align-items: flex-start;
-            }
-            
-            .message.user {
-                justify-content: flex-end;
-            }
-            
-            .message-content {
-                max-width: 70%;
-                padding: 12px 16px;
-                border-radius: 18px;
-                word-wrap: break-word;
-            }
-            
-            .message.user .message-content {
-                background: #007bff;
-                color: white;
-                border-bottom-right-radius: 5px;
-            }
-            
-            .message.assistant .message-content {
-                background: #f8f9fa;
-                color: #333;
-                border: 1px solid #e9ecef;
-                border-bottom-left-radius: 5px;
-            }
-            
-            .skill-badge {
-                background: #e3f2fd;
-                color: #1976d2;
-                padding: 2px 8px;
-                border-radius: 10px;
-                font-size: 11px;
-                margin-bottom: 8px;
-                display: inline-block;
-            }
-            
-            .markdown-body {
-                font-size: 14px;
-                line-height: 1.6;
-            }
-            
-            .sources {
-                margin-top: 10px;
-                padding: 10px;
-                background: #e8f5e8;
-                border-radius: 8px;
-                font-size: 12px;
-            }
-            
-            .sources h4 {
-                margin-bottom: 5px;
-                color: #2e7d32;
-            }
-            
-            .source-item {
-                margin: 3px 0;
-                padding: 3px 6px;
-                background: white;
-                border-radius: 4px;
-                border-left: 3px solid #4caf50;
-            }
-            
-            .input-container {
-                padding: 20px;
-                border-top: 1px solid #e9ecef;
-                background: #f8f9fa;
-            }
-            
-            .input-group {
-                display: flex;
-                gap: 10px;
-            }
-            
-            .input-field {
-                flex: 1;
-                padding: 12px 16px;
-                border: 2px solid #e9ecef;
-                border-radius: 25px;
-                font-size: 14px;
-                outline: none;
-                transition: border-color 0.3s;
-            }
-            
-            .input-field:focus {
-                border-color: #007bff;
-            }
-            
-            .send-button {
-                padding: 12px 24px;
-                background: #007bff;
-                color: white;
-                border: none;
-                border-radius: 25px;
-                cursor: pointer;
-                font-size: 14px;
-                font-weight: 500;
-                transition: background 0.3s;
-            }
-            
-            .send-button:hover:not(:disabled) {
-                background: #0056b3;
-            }
-            
-            .send-button:disabled {
-                background: #6c757d;
-                cursor: not-allowed;
-            }
-            
-            .loading {
-                display: none;
-                text-align: center;
-                padding: 20px;
-                color: #6c757d;
-            }
-            
-            .loading.show {
-                display: block;
-            }
-            
-            .typing-indicator {
-                display: inline-flex;
-                align-items: center;
-                gap: 4px;
-            }
-            
-            .typing-dot {
-                width: 8px;
-                height: 8px;
-                background: #007bff;
-                border-radius: 50%;
-                animation: typing 1.4s infinite;
-            }
-            
-            .typing-dot:nth-child(2) {
-                animation-delay: 0.2s;
-            }
-            
-            .typing-dot:nth-child(3) {
-                animation-delay: 0.4s;
-            }
-            
-            @keyframes typing {
-                0%, 60%, 100% {
-                    transform: translateY(0);
-                }
-                30% {
-                    transform: translateY(-10px);
-                }
-            }
-            
-            .quick-questions {
-                padding: 15px 20px;
-                background: #f8f9fa;
-                border-top: 1px solid #e9ecef;
-            }
-            
-            .quick-questions h4 {
-                margin-bottom: 10px;
-                color: #495057;
-                font-size: 14px;
-            }
-            
-            .quick-buttons {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 8px;
-            }
-            
-            .quick-button {
-                padding: 6px 12px;
-                background: white;
-                border: 1px solid #dee2e6;
-                border-radius: 15px;
-                cursor: pointer;
-                font-size: 12px;
-                color: #495057;
-                transition: all 0.3s;
-            }
-            
-            .quick-button:hover {
-                background: #007bff;
-                color: white;
-                border-color: #007bff;
-            }
-            
-            @media (max-width: 600px) {
-                .container {
-                    width: 95%;
-                    margin: 10px;
-                }
-                
-                .message-content {
-                    max-width: 85%;
-                }
-                
-                .input-group {
-                    flex-direction: column;
-                }
-                
-                .send-button {
-                    align-self: flex-end;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🎓 校园智能助手</h1>
-                <p>北京交通大学威海校区 | 智能路由+多域Agent</p>
-                <div class="skill-indicator" id="skillIndicator">准备就绪</div>
-            </div>
-            
-            <div class="chat-container">
-                <div class="messages" id="messages">
-                    <div class="message assistant">
-                        <div class="message-content">
-                            <div class="skill-badge">系统助手</div>
-                            <div class="markdown-body">👋 您好！我是校园智能助手，采用最新的意图路由技术，可以智能识别您的需求并调用专业Agent为您服务。</div>
-                            <div class="message-time" id="welcome-time"></div>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="loading" id="loading">
-                    <div class="typing-indicator">
-                        <span>AI正在思考</span>
-                        <div class="typing-dot"></div>
-                        <div class="typing-dot"></div>
-                        <div class="typing-dot"></div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="quick-questions">
-                <h4>💡 快速体验</h4>
-                <div class="quick-buttons">
-                    <button class="quick-button" onclick="askQuestion('感冒药能报销吗？')">医疗报销</button>
-                    <button class="quick-button" onclick="askQuestion('常春艳老师联系方式？')">联系人查询</button>
-                    <button class="quick-button" onclick="askQuestion('保研考研留学怎么选择？')">升学规划</button>
-                    <button class="quick-button" onclick="askQuestion('CS专业有哪些发展方向？')">专业指导</button>
-                    <button class="quick-button" onclick="askQuestion('如何开始科研项目？')">科研指导</button>
-                    <button class="quick-button" onclick="askQuestion('你好，小助')">问候测试</button>
-                </div>
-            </div>
-            
-            <div class="input-container">
-                <div class="input-group">
-                    <input 
-                        type="text" 
-                        class="input-field" 
-                        id="questionInput" 
-                        placeholder="请输入您的问题..."
-                        maxlength="500"
-                    >
-                    <button class="send-button" id="sendButton" onclick="sendMessage()">
-                        发送
-                    </button>
-                </div>
-            </div>
-        </div>
-
-        <script>
-            // 初始化WebSocket连接
-            let socket = null;
-            let currentMessageDiv = null;
-            let currentMessageContent = "";
-            
-            // 连接WebSocket
-            function connectWebSocket() {
-                const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-                const wsUrl = `${protocol}//${window.location.host}/ws`;
-                
-                socket = new WebSocket(wsUrl);
-                
-                socket.onopen = function(e) {
-                    console.log("WebSocket连接已建立");
-                    document.getElementById('sendButton').disabled = false;
-                    document.getElementById('sendButton').textContent = '发送';
-                    document.getElementById('skillIndicator').textContent = '连接成功';
-                    showLoading(false);
-                };
-                
-                socket.onmessage = function(event) {
-                    const data = JSON.parse(event.data);
-                    handleWebSocketMessage(data);
-                };
-                
-                socket.onclose = function(event) {
-                    console.log("WebSocket连接已关闭");
-                    document.getElementById('sendButton').disabled = true;
-                    document.getElementById('skillIndicator').textContent = '连接断开';
-                    showLoading(false);
-                    setTimeout(connectWebSocket, 2000);
-                };
-                
-                socket.onerror = function(error) {
-                    console.error("WebSocket错误:", error);
-                    document.getElementById('skillIndicator').textContent = '连接错误';
-                    showLoading(false);
-                };
-            }
-            
-            // 处理WebSocket消息
-            function handleWebSocketMessage(data) {
-                console.log("收到WebSocket消息:", data.type);
-                
-                switch(data.type) {
-                    case "start":
-                        currentMessageDiv = document.createElement('div');
-                        currentMessageDiv.className = "message assistant";
-                        currentMessageContent = "";
-                        
-                        const contentDiv = document.createElement('div');
-                        contentDiv.className = "message-content";
-                        
-                        const skillBadge = document.createElement('div');
-                        skillBadge.className = "skill-badge";
-                        skillBadge.textContent = data.skill_used || "处理中";
-                        contentDiv.appendChild(skillBadge);
-                        
-                        const markdownDiv = document.createElement('div');
-                        markdownDiv.className = "markdown-body";
-                        markdownDiv.id = "current-markdown";
-                        contentDiv.appendChild(markdownDiv);
-                        
-                        currentMessageDiv.appendChild(contentDiv);
-                        document.getElementById('messages').appendChild(currentMessageDiv);
-                        showLoading(true);
-                        break;
-                        
-                    case "chunk":
-                        if (!document.getElementById("current-markdown")) {
-                            handleWebSocketMessage({type: "start"});
-                        }
-                        
-                        currentMessageContent += data.content;
-                        try {
-                            document.getElementById("current-markdown").innerHTML = marked.parse(currentMessageContent);
-                            document.querySelectorAll('pre code').forEach((block) => {
-                                hljs.highlightBlock(block);
-                            });
-                            
-                            const messagesContainer = document.getElementById('messages');
-                            messagesContainer.scrollTop = messagesContainer.scrollHeight;
-                        } catch (error) {
-                            console.error("渲染Markdown时出错:", error);
-                        }
-                        break;
-                        
-                    case "sources":
-                        if (currentMessageDiv && data.content && data.content.length > 0) {
-                            const messageContent = currentMessageDiv.querySelector('.message-content');
-                            
-                            const sourcesDiv = document.createElement('div');
-                            sourcesDiv.className = "sources";
-                            
-                            const sourcesTitle = document.createElement('h4');
-                            sourcesTitle.textContent = "📚 信息来源";
-                            sourcesDiv.appendChild(sourcesTitle);
-                            
-                            data.content.forEach(source => {
-                                const sourceItem = document.createElement('div');
-                                sourceItem.className = "source-item";
-                                sourceItem.textContent = `${source.title} (${source.category})`;
-                                sourcesDiv.appendChild(sourceItem);
-                            });
-                            
-                            messageContent.appendChild(sourcesDiv);
-                        }
-                        break;
-                        
-                    case "end":
-                        if (currentMessageDiv) {
-                            const messageContent = currentMessageDiv.querySelector('.message-content');
-                            
-                            const timeDiv = document.createElement('div');
-                            timeDiv.className = "message-time";
-                            timeDiv.textContent = new Date().toLocaleTimeString();
-                            
-                            messageContent.appendChild(timeDiv);
-                            
-                            const markdownDiv = document.getElementById("current-markdown");
-                            if (markdownDiv) {
-                                markdownDiv.removeAttribute("id");
-                            }
-                            
-                            currentMessageDiv = null;
-                            showLoading(false);
-                        } else {
-                            showLoading(false);
-                        }
-                        break;
-                        
-                    case "error":
-                        addMessage(data.content, 'assistant');
-                        showLoading(false);
-                        break;
-                        
-                    default:
-                        console.warn("未知的消息类型:", data.type);
-                        showLoading(false);
-                }
-            }
-            
-            // 设置欢迎时间
-            document.getElementById('welcome-time').textContent = new Date().toLocaleTimeString();
-            
-            // 连接WebSocket
-            connectWebSocket();
-            
-            // 回车发送消息
-            document.getElementById('questionInput').addEventListener('keypress', function(e) {
-                if (e.key === 'Enter') {
-                    sendMessage();
-                }
-            });
-            
-            // 快速提问
-            function askQuestion(question) {
-                document.getElementById('questionInput').value = question;
-                sendMessage();
-            }
-            
-            // 发送消息
-            function sendMessage() {
-                const input = document.getElementById('questionInput');
-                const question = input.value.trim();
-                
-                if (!question) {
-                    return;
-                }
-                
-                if (!socket || socket.readyState !== WebSocket.OPEN) {
-                    alert("服务器连接已断开，请刷新页面重试");
-                    return;
-                }
-                
-                input.value = '';
-                addMessage(question, 'user');
-                showLoading(true);
-                
-                try {
-                    socket.send(JSON.stringify({
-                        question: question
-                    }));
-                } catch (error) {
-                    console.error("发送消息失败:", error);
-                    showLoading(false);
-                    alert("发送消息失败，请刷新页面重试");
-                }
-            }
-            
-            // 添加消息到聊天界面
-            function addMessage(content, type) {
-                const messagesContainer = document.getElementById('messages');
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${type}`;
-                
-                const contentDiv = document.createElement('div');
-                contentDiv.className = "message-content";
-                
-                if (type === 'user') {
-                    contentDiv.textContent = content;
-                } else {
-                    const markdownDiv = document.createElement('div');
-                    markdownDiv.className = "markdown-body";
-                    markdownDiv.innerHTML = marked.parse(content);
-                    contentDiv.appendChild(markdownDiv);
-                }
-                
-                const timeDiv = document.createElement('div');
-                timeDiv.className = "message-time";
-                timeDiv.textContent = new Date().toLocaleTimeString();
-                contentDiv.appendChild(timeDiv);
-                
-                messageDiv.appendChild(contentDiv);
-                messagesContainer.appendChild(messageDiv);
-                
-                messagesContainer.scrollTop = messagesContainer.scrollHeight;
-            }
-            
-            // 显示/隐藏加载状态
-            function showLoading(show) {
-                const loading = document.getElementById('loading');
-                const sendButton = document.getElementById('sendButton');
-                
-                if (show) {
-                    loading.classList.add('show');
-                    sendButton.disabled = true;
-                    sendButton.textContent = '发送中...';
-                } else {
-                    loading.classList.remove('show');
-                    sendButton.disabled = false;
-                    sendButton.textContent = '发送';
-                }
-            }
-            
-            // 初始化Markdown渲染器
-            marked.setOptions({
-                renderer: new marked.Renderer(),
-                highlight: function(code, language) {
-                    const validLanguage = hljs.getLanguage(language) ? language : 'plaintext';
-                    return hljs.highlight(validLanguage, code).value;
-                },
-                pedantic: false,
-                gfm: true,
-                breaks: true,
-                sanitize: false,
-                smartLists: true,
-                smartypants: false,
-                xhtml: false
-            });
-        </script>
-    </body>
-    </html>
-    """
+    background_tasks.add_task(record_visit_after_response, request, "/ask")
+    headers = {
+        "ETag": ASK_HTML_ETAG,
+        "Cache-Control": "public, max-age=3600",
+        "Vary": "Accept-Encoding"
+    }
+    
+    # 浏览器已缓存相同版本
+    if request.headers.get("if-none-match") == ASK_HTML_ETAG:
+        return Response(status_code=304, headers=headers)
+    
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if ASK_HTML_BR is not None and "br" in accept_encoding:
+        content = ASK_HTML_BR
+        headers["Content-Encoding"] = "br"
+    elif "gzip" in accept_encoding:
+        content = ASK_HTML_GZIP
+        headers["Content-Encoding"] = "gzip"
+    else:
+        content = ASK_HTML_BYTES
+    
+    return Response(content=content, media_type="text/html; charset=utf-8", headers=headers)
+
+# ==================== 健康状态缓存 ====================
+# 通义千问健康检查是一次计费的模型调用：/health 只在缓存的状态超过有效期时才重新检查，
+# 没有探针访问时不调用模型
+HEALTH_STATUS_TTL = float(os.getenv("HEALTH_STATUS_TTL", "60"))
+qwen_health_status: Dict[str, Any] = {"status": "unknown", "model": qwen_llm.model}
+qwen_health_checked_at: Optional[float] = None
+qwen_health_refresh: Optional[asyncio.Task] = None
+
+async def get_qwen_health() -> Dict[str, Any]:
+    """获取通义千问API健康状态 - 有效期内直接复用，同时到达的探针共用一次检查"""
+    global qwen_health_refresh
+    if qwen_health_checked_at is not None and time.monotonic() - qwen_health_checked_at < HEALTH_STATUS_TTL:
+        return qwen_health_status
+    
+    if qwen_health_refresh is None:
+        qwen_health_refresh = asyncio.create_task(refresh_qwen_health())
+    # shield: 探针断开时不取消其他探针也在等待的检查
+    return await asyncio.shield(qwen_health_refresh)
+
+async def refresh_qwen_health() -> Dict[str, Any]:
+    """调用模型刷新通义千问API健康状态"""
+    global qwen_health_status, qwen_health_checked_at, qwen_health_refresh
+    try:
+        qwen_health_status = await asyncio.to_thread(qwen_llm.health_check)
+        qwen_health_checked_at = time.monotonic()
+    finally:
+        qwen_health_refresh = None
+    return qwen_health_status
+
+@app.on_event("shutdown")
+async def close_llm_session():
+    """关闭调用通义千问API的HTTP连接池"""
+    qwen_llm.close()
 
 @app.get("/health")
-async def health(request: Request):
+async def health(request: Request, background_tasks: BackgroundTasks):
     """健康检查"""
-    record_visit(request, "/health")
+    background_tasks.add_task(record_visit_after_response, request, "/health")
     
-    # 检查各组件状态
-    qwen_status = qwen_llm.health_check()
+    # 检查各组件状态 (通义千问API状态为超过有效期时才重新检查)
+    qwen_status = await get_qwen_health()
     skills_status = {}
     
-    for skill_type, skill in skills.items():
-        skills_status[skill_type.value] = skill.get_skill_info()
+    for skill_type in SKILL_FACTORIES:
+        skill = skills.get(skill_type)
+        if skill is not None:
+            skills_status[skill_type.value] = skill.get_skill_info()
+        else:
+            # 尚未用到的技能不为健康检查而加载
+            skills_status[skill_type.value] = {
+                "name": get_skill_display_name(skill_type),
+                "status": "not_loaded"
+            }
     
-    return {
+    # 直接返回响应对象，跳过 jsonable_encoder 的逐键遍历，由orjson直接序列化
+    return ORJSONResponse({
         "status": "healthy" if qwen_status["status"] == "healthy" else "degraded",
         "version": "2.0.0",
         "architecture": "intent_router_multi_skills",
         "qwen_api": qwen_status,
         "skills": skills_status,
-        "total_skills": len(skills)
-    }
+        "total_skills": len(SKILL_FACTORIES)
+    })
+
+# /stats 响应缓存 (过期时间, JSON字节)，统计面板可以接受几秒的延迟
+STATS_CACHE_TTL = 2.0
+stats_cache = (0.0, b"")
 
 @app.get("/stats")
 async def get_stats(request: Request):
-    """获取访问统计"""
-    global access_stats
+    """获取访问统计 (缓存有效期内直接返回上次序列化的结果)"""
+    global stats_cache
     
     record_visit(request, "/stats")
     
+    now = time.monotonic()
+    if now >= stats_cache[0]:
+        stats_cache = (now + STATS_CACHE_TTL, ORJSONResponse(compute_stats()).body)
+    
+    return Response(content=stats_cache[1], media_type="application/json")
+
+def compute_stats() -> Dict[str, Any]:
+    """汇总访问统计"""
     # 计算今日访问量
-    today = datetime.now().date()
+    now = datetime.now()
+    today = now.date()
     today_visits = access_stats["daily_visits"].get(today, 0)
     
     # 计算昨日访问量
     yesterday = today - timedelta(days=1)
     yesterday_visits = access_stats["daily_visits"].get(yesterday, 0)
     
-    # 计算本周访问量
-    week_start = today - timedelta(days=today.weekday())
-    week_visits = sum(
-        v for d, v in access_stats["daily_visits"].items() 
-        if d >= week_start
-    )
+    # 本周访问量 (record_visit 中累加维护)
+    week_visits = access_stats["week_visits"]
     
     # 计算最活跃的小时
     most_active_hour = max(access_stats["hourly_visits"].items(), key=lambda x: x[1]) if access_stats["hourly_visits"] else (0, 0)
@@ -1125,20 +779,19 @@ async def get_stats(request: Request):
         "skill_usage": dict(access_stats["skill_usage"]),
         "intent_accuracy": dict(access_stats["intent_accuracy"]),
         "daily_visits_last_7_days": {
-            str(d): v for d, v in sorted(access_stats["daily_visits"].items())[-7:]
+            str(d): access_stats["daily_visits"][d]
+            for d in access_stats["recent_days"] if d in access_stats["daily_visits"]
         },
         "hourly_distribution": dict(access_stats["hourly_visits"]),
-        "top_user_agents": dict(access_stats["user_agents"].most_common(5)),
-        "last_updated": datetime.now().isoformat()
+        "top_user_agents": dict(access_stats["user_agents"].top(5)),
+        "last_updated": now
     }
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket端点 - 支持流式输出"""
-    # 获取客户端IP
-    client_ip = websocket.client.host
-    if hasattr(websocket, 'headers') and 'x-forwarded-for' in websocket.headers:
-        client_ip = websocket.headers['x-forwarded-for'].split(',')[0].strip()
+    # 获取客户端IP (连接内后续消息直接读取 websocket.state.client_ip)
+    client_ip = get_client_ip(websocket)
     
     # 检查访问频率限制
     if not check_rate_limit(client_ip):
@@ -1150,107 +803,73 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             try:
                 data = await websocket.receive_text()
-                request_data = json.loads(data)
+                request_data = orjson.loads(data)
                 question = request_data.get("question", "").strip()
+                # 新版页面声明支持一帧多条消息 (缓存中的旧页面仍逐条接收)
+                jsonl = bool(request_data.get("jsonl"))
                 
                 # 输入验证
                 if not question:
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": "问题不能为空"
-                    }))
+                    await websocket.send_text(WS_ERROR_EMPTY_QUESTION)
                     continue
                 
                 if len(question) > 500:
-                    await websocket.send_text(json.dumps({
-                        "type": "error", 
-                        "message": "问题长度不能超过500字符"
-                    }))
+                    await websocket.send_text(WS_ERROR_TOO_LONG)
                     continue
                 
                 # 恶意输入检测
-                dangerous_patterns = ['<script', 'javascript:', 'eval(', 'exec(', 'import os', 'subprocess']
-                if any(pattern in question.lower() for pattern in dangerous_patterns):
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": "输入包含不安全内容，请重新输入"
-                    }))
+                if DANGEROUS_INPUT_RE.search(question):
+                    await websocket.send_text(WS_ERROR_UNSAFE_INPUT)
                     continue
                 
-                # 发送开始标记
-                await manager.send_message(json.dumps({
-                    "type": "start",
-                    "question": question
-                }), websocket)
-                
                 try:
                     # 使用新的路由系统处理查询
                     result = await process_query_with_router(question)
                     
-                    # 发送技能信息
-                    await manager.send_message(json.dumps({
-                        "type": "skill_info",
-                        "skill_used": result.get("skill_used", "unknown"),
-                        "intent_confidence": result.get("intent_confidence", 0.0),
-                        "entities": result.get("entities", {})
-                    }), websocket)
-                    
-                    # 发送源信息
+                    # 开始标记、技能信息、源信息、回答内容和完成标记一并发送
+                    messages = [
+                        {"type": "start", "question": question},
+                        {
+                            "type": "skill_info",
+                            "skill_used": result.get("skill_used", "unknown"),
+                            "intent_confidence": result.get("intent_confidence", 0.0),
+                            "entities": result.get("entities", {})
+                        }
+                    ]
                     if result.get("sources"):
-                        await manager.send_message(json.dumps({
-                            "type": "sources",
-                            "content": result["sources"]
-                        }), websocket)
+                        messages.append({"type": "sources", "content": result["sources"]})
                     
-                    # 流式发送回答内容
+                    # 技能直接返回完整回答，一次发送即可
                     content = result.get("content", "")
                     if content:
-                        # 模拟流式输出
-                        words = content.split()
-                        for i in range(0, len(words), 3):  # 每次发送3个词
-                            chunk = " ".join(words[i:i+3])
-                            if i + 3 < len(words):
-                                chunk += " "
-                            
-                            await manager.send_message(json.dumps({
-                                "type": "chunk",
-                                "content": chunk
-                            }), websocket)
-                            
-                            # 添加小延迟模拟流式效果
-                            await asyncio.sleep(0.05)
+                        messages.append({"type": "chunk", "content": content})
                     
-                    # 发送完成标记
-                    await manager.send_message(json.dumps({
-                        "type": "end",
-                        "confidence": result.get("confidence", 0.0)
-                    }), websocket)
+                    messages.append({"type": "end", "confidence": result.get("confidence", 0.0)})
+                    await manager.send_many(messages, websocket, jsonl)
                     
                 except Exception as e:
-                    await manager.send_message(json.dumps({
+                    await manager.send_json({
                         "type": "error",
                         "content": f"处理问题时出错: {str(e)}"
-                    }), websocket)
+                    }, websocket)
                 
             except WebSocketDisconnect:
-                print("WebSocket连接已断开")
+                logger.info("WebSocket连接已断开")
                 break
             except Exception as e:
-                print(f"处理WebSocket消息时出错: {str(e)}")
+                logger.exception("处理WebSocket消息时出错: %s", e)
                 try:
-                    await manager.send_message(json.dumps({
-                        "type": "error",
-                        "content": "服务器处理请求时出错，请刷新页面重试"
-                    }), websocket)
+                    await manager.send_message(WS_ERROR_SERVER, websocket)
                 except Exception:
-                    print("无法发送错误消息，连接可能已断开")
+                    logger.warning("无法发送错误消息，连接可能已断开")
                     break
                 
     except WebSocketDisconnect:
-        print("WebSocket连接已断开")
-        manager.disconnect(websocket)
+        logger.info("WebSocket连接已断开")
     except Exception as e:
-        print(f"WebSocket处理过程中出错: {str(e)}")
+        logger.error("WebSocket处理过程中出错: %s", e)
+    finally:
+        # 循环内 break 退出时也要移除连接
         manager.disconnect(websocket)
 
 if __name__ == "__main__":
@@ -1273,9 +892,17 @@ if __name__ == "__main__":
     print("💡 按 Ctrl+C 停止服务")
     print("")
     
+    # 工作进程数 (访问统计和限流保存在进程内存中，多进程时按进程分别计数)
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+    
     uvicorn.run(
-        app,
+        app if WORKERS == 1 else "qwen_router_app:app",
         host="0.0.0.0",
         port=PORT,
+        workers=WORKERS,
+        # auto: 已安装 uvloop/httptools 时自动使用，未安装的平台 (如Windows) 回退到标准实现
+        loop="auto",
+        http="auto",
+        access_log=False,
         log_level="info"
     )
@@ -3,20 +3,42 @@
 通义千问集成版 - 医疗报销智能助手 (流式输出 + Markdown渲染)
 """
 import os
+import re
 import json
+import logging
 import time
+import gzip
+import pickle
+import hashlib
 import asyncio
 from datetime import datetime, timedelta
-from collections import defaultdict, Counter
-from typing import List, Dict, Any, AsyncGenerator
-from fastapi import FastAPI, Request, Body, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
+from collections import defaultdict, deque
+from typing import List, Dict, Any, AsyncGenerator, NamedTuple, Tuple, Set, Optional
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi.requests import HTTPConnection
+from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse, Response, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 import uvicorn
+import orjson
+import numpy as np
 from pathlib import Path
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # 导入通义千问集成模块
 from src.core.rag.qwen_stream_integration import QwenStreamLLM
+from src.core.knowledge.search_index import FieldIndex
+from src.core.stats.hyperloglog import HyperLogLog
+from src.core.stats.space_saving import SpaceSaving
+from src.config.logging_config import setup_logging
+
+# 日志经队列交给后台线程写出，请求处理中不再同步写stdout
+setup_logging(os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 
 # 从环境变量读取API密钥（部署时通过环境变量注入）
 # 本地开发时可在shell中执行：export DASHSCOPE_API_KEY=your_key
@@ -25,11 +47,12 @@ from src.core.rag.qwen_stream_integration import QwenStreamLLM
 # API密钥通过环境变量管理（Railway已配置DASHSCOPE_API_KEY）
 # 本地开发时请设置环境变量：export DASHSCOPE_API_KEY=your_key
 
-# 创建应用
+# 创建应用 (JSON响应使用 orjson 序列化)
 app = FastAPI(
     title="医疗报销智能助手",
     version="1.0.0",
-    description="基于通义千问的医疗报销智能问答系统"
+    description="基于通义千问的医疗报销智能问答系统",
+    default_response_class=ORJSONResponse
 )
 
 # 添加CORS中间件
@@ -50,46 +73,84 @@ access_stats = {
     "total_visits": 0,
     "daily_visits": defaultdict(int),
     "hourly_visits": defaultdict(int),
-    "unique_ips": set(),
+    "unique_ips": HyperLogLog(),  # 独立IP数估计 (固定内存，不随访客数增长)
     "endpoint_stats": defaultdict(int),
-    "user_agents": Counter(),
+    "user_agents": SpaceSaving(k=64),  # 常见User-Agent (固定64个计数槽，不随UA种类增长)
+    "recent_days": deque(maxlen=7),  # 最近有访问的7天 (按日期先后)
+    "week_start": None,              # 本周一的日期
+    "week_visits": 0,                # 本周访问量 (随访问累加，每天首次访问时按需重算)
     "last_reset": datetime.now().date()
 }
 
+def get_client_ip(conn: HTTPConnection) -> str:
+    """获取客户端IP (优先取 X-Forwarded-For 第一项)，结果缓存在 conn.state 上"""
+    client_ip = getattr(conn.state, "client_ip", None)
+    if client_ip is not None:
+        return client_ip
+    
+    xff = conn.headers.get('x-forwarded-for')
+    if xff:
+        comma = xff.find(',')
+        client_ip = (xff[:comma] if comma >= 0 else xff).strip()
+    else:
+        client_ip = conn.client.host if conn.client else "unknown"
+    
+    conn.state.client_ip = client_ip
+    return client_ip
+
 def record_visit(request: Request, endpoint: str = ""):
     """记录访问统计"""
     global access_stats
     
     # 获取客户端IP
-    client_ip = request.client.host
-    if hasattr(request, 'headers') and 'x-forwarded-for' in request.headers:
-        client_ip = request.headers['x-forwarded-for'].split(',')[0].strip()
+    client_ip = get_client_ip(request)
     
     # 获取User-Agent
     user_agent = request.headers.get('user-agent', 'Unknown')
     
+    # 清理旧数据（保留最近30天）- 只在每天第一次访问时执行，其余请求无需遍历
+    now = datetime.now()
+    today = now.date()
+    daily_visits = access_stats["daily_visits"]
+    if today not in daily_visits:
+        cutoff_date = today - timedelta(days=30)
+        for d in [d for d in daily_visits if d < cutoff_date]:
+            del daily_visits[d]
+        
+        # 新的一天：滚动最近7天列表，跨周时重算本周访问量
+        access_stats["recent_days"].append(today)
+        week_start = today - timedelta(days=today.weekday())
+        if week_start != access_stats["week_start"]:
+            access_stats["week_start"] = week_start
+            access_stats["week_visits"] = sum(v for d, v in daily_visits.items() if d >= week_start)
+    
     # 记录统计
     access_stats["total_visits"] += 1
-    access_stats["daily_visits"][datetime.now().date()] += 1
-    access_stats["hourly_visits"][datetime.now().hour] += 1
+    daily_visits[today] += 1
+    access_stats["week_visits"] += 1
+    access_stats["hourly_visits"][now.hour] += 1
     access_stats["unique_ips"].add(client_ip)
     access_stats["endpoint_stats"][endpoint] += 1
-    access_stats["user_agents"][user_agent] += 1
-    
-    # 清理旧数据（保留最近30天）
-    cutoff_date = datetime.now().date() - timedelta(days=30)
-    access_stats["daily_visits"] = {
-        d: v for d, v in access_stats["daily_visits"].items() 
-        if d >= cutoff_date
-    }
+    access_stats["user_agents"].add(user_agent)
     
     # 打印访问日志
-    print(f"📊 访问统计: {endpoint} | IP: {client_ip} | 总访问: {access_stats['total_visits']}")
+    logger.info("📊 访问统计: %s | IP: %s | 总访问: %s", endpoint, client_ip, access_stats['total_visits'])
+
+async def record_visit_after_response(request: Request, endpoint: str):
+    """响应发送后再记录访问统计
+
+    供 BackgroundTasks 使用：协程在事件循环中执行，同步函数则会被放到线程池，
+    与请求处理中对 access_stats 的修改产生竞争。
+    """
+    record_visit(request, endpoint)
 
 # ==================== 访问控制功能 ====================
 # 访问控制配置
 rate_limit = {
-    "requests": defaultdict(list),  # IP -> [timestamp1, timestamp2, ...]
+    "requests": defaultdict(deque),         # IP -> 最近1小时的请求时间戳
+    "recent_requests": defaultdict(deque),  # IP -> 最近1分钟的请求时间戳
+    "checks": 0,                    # 累计检查次数
+    "sweep_interval": 1000,         # 每检查多少次清理一次不活跃的IP
     "max_requests_per_minute": 60,  # 每分钟最大请求数
     "max_requests_per_hour": 1000,  # 每小时最大请求数
     "blocked_ips": set(),           # 被阻止的IP
@@ -113,37 +174,47 @@ def check_rate_limit(client_ip: str) -> bool:
     
     current_time = time.time()
     
-    # 清理旧的时间戳（超过1小时）
-    rate_limit["requests"][client_ip] = [
-        ts for ts in rate_limit["requests"][client_ip] 
-        if current_time - ts < 3600
-    ]
+    # 每隔一定次数清理长时间没有请求的IP，避免字典无限增长
+    rate_limit["checks"] += 1
+    if rate_limit["checks"] % rate_limit["sweep_interval"] == 0:
+        stale_ips = [
+            ip for ip, timestamps in rate_limit["requests"].items()
+            if not timestamps or current_time - timestamps[-1] >= 3600
+        ]
+        for ip in stale_ips:
+            del rate_limit["requests"][ip]
+            rate_limit["recent_requests"].pop(ip, None)
+    
+    # 清理旧的时间戳（超过1小时）- 时间戳按先后顺序追加，过期的总在队首
+    hour_requests = rate_limit["requests"][client_ip]
+    while hour_requests and current_time - hour_requests[0] >= 3600:
+        hour_requests.popleft()
     
     # 检查每小时限制
-    if len(rate_limit["requests"][client_ip]) >= rate_limit["max_requests_per_hour"]:
+    if len(hour_requests) >= rate_limit["max_requests_per_hour"]:
         rate_limit["blocked_ips"].add(client_ip)
-        print(f"🚫 IP {client_ip} 因超过每小时限制被阻止")
+        logger.warning("🚫 IP %s 因超过每小时限制被阻止", client_ip)
         return False
     
-    # 检查每分钟限制
-    recent_requests = [
-        ts for ts in rate_limit["requests"][client_ip] 
-        if current_time - ts < 60
-    ]
+    # 检查每分钟限制 (单独维护最近1分钟的时间戳，无需再次遍历)
+    minute_requests = rate_limit["recent_requests"][client_ip]
+    while minute_requests and current_time - minute_requests[0] >= 60:
+        minute_requests.popleft()
     
-    if len(recent_requests) >= rate_limit["max_requests_per_minute"]:
-        print(f"⚠️ IP {client_ip} 超过每分钟限制，但未阻止")
+    if len(minute_requests) >= rate_limit["max_requests_per_minute"]:
+        logger.warning("⚠️ IP %s 超过每分钟限制，但未阻止", client_ip)
         return True  # 暂时允许，但记录警告
     
     # 记录当前请求
-    rate_limit["requests"][client_ip].append(current_time)
+    hour_requests.append(current_time)
+    minute_requests.append(current_time)
     return True
 
 # 加载知识库
 def load_knowledge_base(file_path: str = "data/knowledge_base.json") -> Dict:
     """加载知识库 - 强制使用真实数据"""
-    print("\n" + "="*50)
-    print("开始加载知识库...")
+    logger.info("\n" + "="*50)
+    logger.info("开始加载知识库...")
     
     # 强制使用指定的知识库文件
     if not Path(file_path).exists():
@@ -151,9 +222,9 @@ def load_knowledge_base(file_path: str = "data/knowledge_base.json") -> Dict:
     
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            print(f"正在读取知识库文件: {file_path}")
+            logger.info("正在读取知识库文件: %s", file_path)
             file_content = f.read()
-            print(f"文件大小: {len(file_content)} 字节")
+            logger.info("文件大小: %s 字节", len(file_content))
             
             # 解析JSON
             data = json.loads(file_content)
@@ -176,41 +247,142 @@ def load_knowledge_base(file_path: str = "data/knowledge_base.json") -> Dict:
                 categorized_data[category].append(item)
             
             # 打印详细统计信息
-            print("\n知识库加载统计:")
+            logger.info("\n知识库加载统计:")
             total_items = 0
             for category, items in categorized_data.items():
                 item_count = len(items)
                 total_items += item_count
-                print(f"- {category}: {item_count} 条")
+                logger.info("- %s: %s 条", category, item_count)
             
-            print(f"\n知识库加载成功! 共 {total_items} 条知识项")
-            print("="*50 + "\n")
+            logger.info("\n知识库加载成功! 共 %s 条知识项", total_items)
+            logger.info("="*50 + "\n")
             
             # 返回重组后的数据
             return {"knowledge_base": categorized_data}
             
     except json.JSONDecodeError as je:
         error_msg = f"知识库文件JSON格式错误: {je}"
-        print(error_msg)
+        logger.error(error_msg)
         raise ValueError(error_msg)
     except Exception as e:
         error_msg = f"加载知识库时出错: {e}"
-        print(error_msg)
+        logger.error(error_msg)
         raise RuntimeError(error_msg)
 
+class LowercaseFields(NamedTuple):
+    """知识项各匹配字段的小写形式 (不可变元组，比逐项字典更省内存)"""
+    title: str
+    content: str
+    tags: Tuple[str, ...]
+    scenario_inputs: Tuple[str, ...]
+    question: str
+    scenario: str
+    name: str
+    dept: str
+
+def lowercase_item_fields(item: Dict) -> LowercaseFields:
+    """预先计算知识项各匹配字段的小写形式"""
+    return LowercaseFields(
+        title=item.get("title", "").lower(),
+        content=item.get("content", "").lower(),
+        tags=tuple(tag.lower() for tag in item.get("tags", [])),
+        scenario_inputs=tuple(
+            scenario.get("input", "").lower() for scenario in item.get("scenarios", [])
+        ),
+        question=item.get("question", "").lower(),
+        scenario=item.get("scenario", "").lower(),
+        name=item.get("name", "").lower(),
+        dept=item.get("dept", "").lower()
+    )
+
+def build_search_state(knowledge_base: Dict) -> Tuple:
+    """根据知识库预先计算小写字段和倒排索引"""
+    # 按原有顺序展开的知识项，按字段拆成并列的只读数组 (分类/原始条目/小写字段)
+    # 知识库只在启动时加载一次，小写字段随之预先计算，检索时只需转换查询
+    categorized = knowledge_base.get("knowledge_base", {})
+    search_categories = tuple(
+        category for category, items in categorized.items() for _ in items
+    )
+    search_entries = tuple(item for items in categorized.values() for item in items)
+    search_lowered = tuple(lowercase_item_fields(item) for item in search_entries)
+    
+    # 覆盖所有匹配字段的倒排索引
+    # 只有某个字段包含查询或关键词的知识项才可能得分，检索时只需对这些候选项打分
+    search_text_index = FieldIndex(
+        (position, text)
+        for position, lowered in enumerate(search_lowered)
+        for text in (
+            lowered.title, lowered.content, *lowered.tags, *lowered.scenario_inputs,
+            lowered.question, lowered.scenario, lowered.name, lowered.dept
+        )
+    )
+    # 报销比例类问题不依赖文本匹配，含 ratio 字段的知识项始终作为候选
+    ratio_positions = frozenset(
+        position for position, item in enumerate(search_entries) if "ratio" in item
+    )
+    
+    return search_categories, search_entries, search_lowered, search_text_index, ratio_positions
+
+# 检索状态缓存的格式版本：LowercaseFields、FieldIndex 或 build_search_state 变化时必须递增，
+# 否则知识库文件未变时会继续读取按旧代码构建的pickle
+SEARCH_STATE_VERSION = 1
+
+def load_search_state(file_path: str, cache_path: Path) -> Tuple:
+    """加载知识库及检索索引 - 知识库文件未变化时直接读取pickle缓存"""
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"严重错误: 知识库文件不存在: {file_path}")
+    
+    stat = Path(file_path).stat()
+    signature = (SEARCH_STATE_VERSION, stat.st_mtime_ns, stat.st_size)
+    
+    # 缓存以格式版本及知识库文件的修改时间和大小作为签名，任一变化即重新构建
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_signature, state = pickle.load(f)
+        if cached_signature == signature:
+            logger.info("知识库缓存命中: %s", cache_path)
+            return state
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # 文件损坏或类定义已变化 (UnpicklingError/AttributeError/ImportError等) 均按未命中处理
+        logger.warning("⚠️ 读取知识库缓存失败，重新构建: %s", e)
+    
+    knowledge_base = load_knowledge_base(file_path)
+    state = (knowledge_base, *build_search_state(knowledge_base))
+    
+    # 先写临时文件再原子替换，多个worker同时启动时不会读到半个文件
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((signature, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning("⚠️ 写入知识库缓存失败: %s", e)
+        tmp_path.unlink(missing_ok=True)
+    
+    return state
+
 # 加载知识库 - 使用绝对路径确保正确加载
 KNOWLEDGE_BASE_PATH = str(Path(__file__).parent / "data" / "knowledge_base.json")
-print(f"知识库绝对路径: {KNOWLEDGE_BASE_PATH}")
-knowledge_base = load_knowledge_base(KNOWLEDGE_BASE_PATH)
+KNOWLEDGE_CACHE_PATH = Path(__file__).parent / "data" / ".kb_cache.pkl"
+logger.info("知识库绝对路径: %s", KNOWLEDGE_BASE_PATH)
+(
+    knowledge_base, search_categories, search_entries, search_lowered,
+    search_text_index, ratio_positions
+) = load_search_state(KNOWLEDGE_BASE_PATH, KNOWLEDGE_CACHE_PATH)
+
+# 知识项总数 (知识库加载后不再变化，健康检查直接返回)
+KNOWLEDGE_ITEM_COUNT = len(search_entries)
 
 def search_knowledge(query: str, limit: int = 5) -> List[Dict]:
     """搜索知识库 - 彻底重写版"""
-    print("\n" + "-"*50)
-    print(f"收到用户查询: '{query}'")
+    logger.info("\n" + "-"*50)
+    logger.info("收到用户查询: '%s'", query)
     
-    # 确保知识库已加载
-    if not knowledge_base or not knowledge_base.get("knowledge_base"):
-        print("错误: 知识库未正确加载")
+    # 确保知识库已加载 (知识项总数在启动时已计算，空知识库直接返回)
+    if not KNOWLEDGE_ITEM_COUNT:
+        logger.error("错误: 知识库未正确加载")
         return []
     
     query_lower = query.lower()
@@ -218,46 +390,64 @@ def search_knowledge(query: str, limit: int = 5) -> List[Dict]:
     
     # 1. 提取关键词
     keywords = extract_keywords(query_lower)
-    print(f"提取关键词: {keywords}")
+    logger.info("提取关键词: %s", keywords)
     
     # 2. 特殊关键词处理 - 针对北交威海校区特定词汇
     special_keywords = detect_special_keywords(query_lower)
     if special_keywords:
-        print(f"检测到特殊关键词: {special_keywords}")
+        logger.info("检测到特殊关键词: %s", special_keywords)
         keywords.extend(special_keywords)
     
-    # 3. 搜索所有知识分类
-    print("\n开始搜索知识库...")
-    for category, items in knowledge_base.get("knowledge_base", {}).items():
-        print(f"搜索分类: {category} ({len(items)}条)")
-        
-        for item in items:
-            score = calculate_item_score(item, query_lower, keywords, category)
-            
-            if score > 0:
-                item_copy = item.copy()
-                item_copy["score"] = score
-                item_copy["category"] = category
-                results.append(item_copy)
+    # 3. 通过倒排索引找出候选知识项
+    logger.info("\n开始搜索知识库...")
+    candidates = set()
+    for term in {query_lower, *keywords}:
+        candidates.update(search_text_index.match(term).tolist())
+    if "比例" in query_lower or "百分比" in query_lower or "报销比例" in query_lower:
+        candidates.update(ratio_positions)
+    logger.info("候选知识项: %s/%s条", len(candidates), KNOWLEDGE_ITEM_COUNT)
+    
+    # 按知识库原有顺序为候选项打分，分数存入连续数组
+    positions = np.fromiter(sorted(candidates), dtype=np.intp, count=len(candidates))
+    scores = np.fromiter(
+        (
+            calculate_item_score(
+                search_entries[position], query_lower, keywords,
+                search_categories[position], search_lowered[position]
+            )
+            for position in positions
+        ),
+        dtype=np.int64,
+        count=len(positions)
+    )
     
-    # 4. 按分数排序
-    results.sort(key=lambda x: x.get("score", 0), reverse=True)
+    # 4. 按分数排序 (稳定排序，同分保持知识库原有顺序)
+    order = np.argsort(-scores, kind="stable")
+    matched = order[scores[order] > 0]
+    # 只为最终返回的前 limit 条构建结果字典，其余候选项不复制
+    for index in matched[:limit]:
+        position = positions[index]
+        results.append({
+            **search_entries[position],
+            "score": scores[index].item(),
+            "category": search_categories[position]
+        })
     
     # 5. 打印搜索结果
-    print(f"\n找到 {len(results)} 条匹配结果")
+    logger.info("\n找到 %s 条匹配结果", len(matched))
     if results:
-        print("\n排名前 {min(limit, len(results))} 条结果:")
+        logger.info("\n排名前 %s 条结果:", min(limit, len(results)))
         for i, result in enumerate(results[:limit]):
-            print(f"结果 {i+1}: [{result.get('category')}] {result.get('title')} (分数: {result.get('score')})")
+            logger.info("结果 %s: [%s] %s (分数: %s)", i+1, result.get('category'), result.get('title'), result.get('score'))
             # 打印匹配的内容摘要
             content = result.get('content', '')
             if len(content) > 100:
                 content = content[:100] + "..."
-            print(f"   内容: {content}")
+            logger.info("   内容: %s", content)
     else:
-        print("未找到匹配结果")
+        logger.info("未找到匹配结果")
     
-    print("-"*50 + "\n")
+    logger.info("-"*50 + "\n")
     
     # 6. 如果没有找到结果，返回一些默认项
     if not results:
@@ -273,118 +463,119 @@ def search_knowledge(query: str, limit: int = 5) -> List[Dict]:
     
     return results[:limit]
 
-def calculate_item_score(item: Dict, query: str, keywords: List[str], category: str) -> float:
+def calculate_item_score(item: Dict, query: str, keywords: List[str], category: str, lowered: LowercaseFields = None) -> float:
     """计算知识项的匹配分数"""
     score = 0
     
-    # 获取各字段的小写版本
-    title_lower = item.get("title", "").lower()
-    content_lower = item.get("content", "").lower()
-    tags = [tag.lower() for tag in item.get("tags", [])]
+    # 获取各字段的小写版本 (优先使用加载时预先计算的结果)
+    if lowered is None:
+        lowered = lowercase_item_fields(item)
+    title_lower = lowered.title
+    content_lower = lowered.content
+    tags = lowered.tags
     
     # 1. 完全匹配加高分
     if query in title_lower:
         score += 10
-        print(f"  - 标题完全匹配: {item.get('title')} (+10)")
+        logger.info("  - 标题完全匹配: %s (+10)", item.get('title'))
     
     if query in content_lower:
         score += 6
-        print(f"  - 内容完全匹配: {item.get('id')} (+6)")
+        logger.info("  - 内容完全匹配: %s (+6)", item.get('id'))
     
     # 2. 关键词匹配
     for keyword in keywords:
         # 标题关键词匹配
         if keyword in title_lower:
             score += 5
-            print(f"  - 标题关键词匹配: {keyword} in {item.get('title')} (+5)")
+            logger.info("  - 标题关键词匹配: %s in %s (+5)", keyword, item.get('title'))
         
         # 内容关键词匹配
         if keyword in content_lower:
             score += 3
-            print(f"  - 内容关键词匹配: {keyword} in {item.get('id')} (+3)")
+            logger.info("  - 内容关键词匹配: %s in %s (+3)", keyword, item.get('id'))
         
         # 标签关键词匹配
         for tag in tags:
             if keyword in tag:
                 score += 4
-                print(f"  - 标签关键词匹配: {keyword} in {tag} (+4)")
+                logger.info("  - 标签关键词匹配: %s in %s (+4)", keyword, tag)
     
     # 3. 特定字段匹配
     
     # 问候匹配
     if category == "greetings" and "scenarios" in item:
-        scenarios = item.get("scenarios", [])
-        for scenario in scenarios:
-            input_text = scenario.get("input", "").lower()
+        for input_text in lowered.scenario_inputs:
             if query == input_text or query in input_text:
                 score += 20  # 问候完全匹配给最高分
-                print(f"  - 问候完全匹配: {input_text} (+20)")
+                logger.info("  - 问候完全匹配: %s (+20)", input_text)
                 break
             
             # 问候关键词匹配
             for keyword in keywords:
                 if keyword in input_text:
                     score += 10
-                    print(f"  - 问候关键词匹配: {keyword} in {input_text} (+10)")
+                    logger.info("  - 问候关键词匹配: %s in %s (+10)", keyword, input_text)
     
     # FAQ问题匹配
     if "question" in item:
-        question_lower = item.get("question", "").lower()
+        question_lower = lowered.question
         if query in question_lower:
             score += 12  # FAQ问题完全匹配给较高分
-            print(f"  - FAQ问题完全匹配: {item.get('question')} (+12)")
+            logger.info("  - FAQ问题完全匹配: %s (+12)", item.get('question'))
         
         # FAQ问题关键词匹配
         for keyword in keywords:
             if keyword in question_lower:
                 score += 6
-                print(f"  - FAQ问题关键词匹配: {keyword} (+6)")
+                logger.info("  - FAQ问题关键词匹配: %s (+6)", keyword)
     
     # 特殊场景匹配
     if "scenario" in item:
-        scenario_lower = item.get("scenario", "").lower()
+        scenario_lower = lowered.scenario
         if query in scenario_lower:
             score += 8
-            print(f"  - 场景完全匹配: {item.get('scenario')} (+8)")
+            logger.info("  - 场景完全匹配: %s (+8)", item.get('scenario'))
         
         # 场景关键词匹配
         for keyword in keywords:
             if keyword in scenario_lower:
                 score += 4
-                print(f"  - 场景关键词匹配: {keyword} (+4)")
+                logger.info("  - 场景关键词匹配: %s (+4)", keyword)
     
     # 4. 特殊处理 - 人名匹配
-    if "name" in item and any(keyword in item.get("name", "").lower() for keyword in keywords):
+    if "name" in item and any(keyword in lowered.name for keyword in keywords):
         score += 15  # 人名匹配给最高分
-        print(f"  - 人名匹配: {item.get('name')} (+15)")
+        logger.info("  - 人名匹配: %s (+15)", item.get('name'))
     
     # 5. 特殊处理 - 联系人部门匹配
-    if "dept" in item and any(keyword in item.get("dept", "").lower() for keyword in keywords):
+    if "dept" in item and any(keyword in lowered.dept for keyword in keywords):
         score += 8
-        print(f"  - 部门匹配: {item.get('dept')} (+8)")
+        logger.info("  - 部门匹配: %s (+8)", item.get('dept'))
     
     # 6. 特殊处理 - 医院名称匹配
     if category == "hospitals" and "name" in item:
-        hospital_name = item.get("name", "").lower()
+        hospital_name = lowered.name
         if any(keyword in hospital_name for keyword in keywords):
             score += 10
-            print(f"  - 医院名称匹配: {item.get('name')} (+10)")
+            logger.info("  - 医院名称匹配: %s (+10)", item.get('name'))
     
     # 7. 特殊处理 - 报销比例匹配
     if "ratio" in item and ("比例" in query or "百分比" in query or "报销比例" in query):
         score += 7
-        print(f"  - 报销比例匹配: {item.get('ratio')} (+7)")
+        logger.info("  - 报销比例匹配: %s (+7)", item.get('ratio'))
     
     return score
 
 def detect_special_keywords(query: str) -> List[str]:
     """检测特殊关键词"""
     special_keywords = []
+    query_lower = query.lower()
     
     # 问候匹配
     greetings = ["你好", "早上好", "中午好", "下午好", "晚上好", "嗨", "hi", "hello", "谢谢", "感谢", "再见", "拜拜"]
     for greeting in greetings:
-        if greeting in query.lower():
+        if greeting in query_lower:
             special_keywords.append("问候")
             special_keywords.append(greeting)
             break
@@ -477,65 +668,269 @@ def extract_keywords(text: str) -> List[str]:
     
     return words
 
+# 恶意输入检测规则 (合并为一个忽略大小写的正则，一次扫描完成检测)
+DANGEROUS_PATTERNS = ['<script', 'javascript:', 'eval(', 'exec(', 'import os', 'subprocess']
+DANGEROUS_INPUT_RE = re.compile("|".join(map(re.escape, DANGEROUS_PATTERNS)), re.IGNORECASE)
+
+def build_rag_context(question: str, context_items: List[Dict]) -> Tuple[str, List[Dict]]:
+    """根据检索结果构建结构化上下文和前端展示的来源信息"""
+    # 先收集片段，最后一次拼接
+    context_parts = []
+    sources = []
+    
+    for i, item in enumerate(context_items):
+        # 获取分类名称的中文表示
+        category_name = get_category_chinese_name(item.get("category", ""))
+        
+        # 构建结构化的知识条目
+        context_parts.append(f"【知识条目 {i+1}】\n")
+        context_parts.append(f"分类: {category_name}\n")
+        
+        # 对于FAQ类型，优先使用question作为标题
+        if item.get("category") == "common_questions" and "question" in item:
+            context_parts.append(f"标题: {item.get('question', '')}\n")
+        else:
+            title = item.get('title', '')
+            if title:
+                context_parts.append(f"标题: {title}\n")
+        
+        # 添加特定字段
+        if item.get("category") == "common_questions":
+            # 问题已作为标题写入，这里只补充回答
+            if "answer" in item:
+                context_parts.append(f"回答: {item.get('answer', '')}\n")
+        elif item.get("category") == "greetings":
+            if "scenarios" in item:
+                scenarios = item.get("scenarios", [])
+                question_lower = question.lower()
+                for scenario in scenarios:
+                    scenario_input = scenario.get("input", "").lower()
+                    if question_lower == scenario_input or question_lower in scenario_input:
+                        context_parts.append(f"问候类型: {scenario.get('input', '')}\n")
+                        context_parts.append(f"回复: {scenario.get('response', '')}\n")
+                        break
+        elif item.get("category") == "contacts":
+            if "name" in item:
+                context_parts.append(f"姓名: {item.get('name', '')}\n")
+            if "dept" in item:
+                context_parts.append(f"部门: {item.get('dept', '')}\n")
+            if "role" in item:
+                context_parts.append(f"职责: {item.get('role', '')}\n")
+            if "office_location" in item:
+                context_parts.append(f"办公地点: {item.get('office_location', '')}\n")
+        elif item.get("category") == "hospitals":
+            if "name" in item:
+                context_parts.append(f"医院名称: {item.get('name', '')}\n")
+            if "address" in item:
+                context_parts.append(f"医院地址: {item.get('address', '')}\n")
+            if "phone" in item:
+                context_parts.append(f"联系电话: {item.get('phone', '')}\n")
+            if "service_hours" in item:
+                context_parts.append(f"服务时间: {item.get('service_hours', '')}\n")
+            if "complaint_phone" in item:
+                context_parts.append(f"投诉电话: {item.get('complaint_phone', '')}\n")
+            if "appointment_channels" in item:
+                context_parts.append(f"预约渠道: {item.get('appointment_channels', '')}\n")
+            if "contract_status" in item:
+                context_parts.append(f"合同状态: {item.get('contract_status', '')}\n")
+        elif item.get("category") == "materials_requirements":
+            if "checklist" in item:
+                context_parts.append("所需材料清单:\n")
+                for material in item.get("checklist", []):
+                    context_parts.append(f"- {material}\n")
+        
+        # 添加通用内容
+        context_parts.append(f"内容: {item.get('content', '')}\n")
+        
+        # 添加重要的额外字段
+        if "ratio" in item:
+            context_parts.append(f"报销比例: {item.get('ratio', '')}\n")
+        if "notes" in item:
+            context_parts.append(f"注意事项: {item.get('notes', '')}\n")
+        if "tags" in item:
+            context_parts.append(f"标签: {', '.join(item.get('tags', []))}\n")
+        
+        # 添加分隔符
+        context_parts.append("\n---\n\n")
+        
+        # 构建前端展示的来源信息
+        sources.append({
+            "id": item.get("id", ""),
+            "title": item.get("title", ""),
+            "category": category_name,
+            "score": item.get("score", 0)
+        })
+    
+    context = "".join(context_parts)
+    
+    return context, sources
+
 # 连接管理器
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # 集合存储，连接关闭时 O(1) 移除
+        self.active_connections: Set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
 
     async def send_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
+    async def send_json(self, data: Dict[str, Any], websocket: WebSocket):
+        """orjson序列化后以文本帧发送 (前端按文本解析JSON)"""
+        await websocket.send_text(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode())
+
+    async def send_many(self, messages: List[Dict[str, Any]], websocket: WebSocket, jsonl: bool):
+        """发送多条消息：客户端支持时合并为一个文本帧 (每行一条JSON)，否则逐条发送"""
+        if not jsonl:
+            for data in messages:
+                await self.send_json(data, websocket)
+            return
+        
+        await websocket.send_text(b"\n".join(
+            orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS) for data in messages
+        ).decode())
+
 manager = ConnectionManager()
 
+# 固定内容的WebSocket错误消息 (启动时序列化一次)
+WS_ERROR_EMPTY_QUESTION = orjson.dumps({"type": "error", "message": "问题不能为空"}).decode()
+WS_ERROR_TOO_LONG = orjson.dumps({"type": "error", "message": "问题长度不能超过500字符"}).decode()
+WS_ERROR_UNSAFE_INPUT = orjson.dumps({"type": "error", "message": "输入包含不安全内容，请重新输入"}).decode()
+WS_ERROR_SERVER = orjson.dumps({"type": "error", "content": "服务器处理请求时出错，请刷新页面重试"}).decode()
+
+# 流式回答的合并窗口 (秒)：窗口内连续到达的文本块合并为一个WebSocket帧发送
+WS_CHUNK_WINDOW = 0.005
+
+async def coalesce_chunks(chunks: AsyncGenerator[str, None], window: float = WS_CHUNK_WINDOW) -> AsyncGenerator[str, None]:
+    """合并短时间内连续到达的文本块，减少发送的帧数
+
+    后台任务持续读取模型输出，收到一块后等待一个窗口，再把期间到达的文本一并返回。
+    """
+    pending: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    
+    async def produce():
+        try:
+            async for chunk in chunks:
+                pending.put_nowait(chunk)
+        finally:
+            pending.put_nowait(finished)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        done = False
+        while not done:
+            chunk = await pending.get()
+            if chunk is finished:
+                break
+            
+            await asyncio.sleep(window)
+            parts = [chunk]
+            while not pending.empty():
+                chunk = pending.get_nowait()
+                if chunk is finished:
+                    done = True
+                    break
+                parts.append(chunk)
+            yield "".join(parts)
+        
+        # 传递生成过程中的异常
+        await producer
+    finally:
+        producer.cancel()
+
 @app.get("/")
-async def root(request: Request):
+async def root(request: Request, background_tasks: BackgroundTasks):
     """根路径 - 自动重定向到Web界面"""
-    record_visit(request, "/")
+    background_tasks.add_task(record_visit_after_response, request, "/")
     return RedirectResponse(url="/web", status_code=302)
 
+# ==================== 健康状态缓存 ====================
+# 通义千问健康检查是一次计费的模型调用：/health 只在缓存的状态超过有效期时才重新检查，
+# 没有探针访问时不调用模型
+HEALTH_STATUS_TTL = float(os.getenv("HEALTH_STATUS_TTL", "60"))
+qwen_health_status: Dict[str, Any] = {"status": "unknown", "model": qwen_llm.model}
+qwen_health_checked_at: Optional[float] = None
+qwen_health_refresh: Optional[asyncio.Task] = None
+
+async def get_qwen_health() -> Dict[str, Any]:
+    """获取通义千问API健康状态 - 有效期内直接复用，同时到达的探针共用一次检查"""
+    global qwen_health_refresh
+    if qwen_health_checked_at is not None and time.monotonic() - qwen_health_checked_at < HEALTH_STATUS_TTL:
+        return qwen_health_status
+    
+    if qwen_health_refresh is None:
+        qwen_health_refresh = asyncio.create_task(refresh_qwen_health())
+    # shield: 探针断开时不取消其他探针也在等待的检查
+    return await asyncio.shield(qwen_health_refresh)
+
+async def refresh_qwen_health() -> Dict[str, Any]:
+    """调用模型刷新通义千问API健康状态"""
+    global qwen_health_status, qwen_health_checked_at, qwen_health_refresh
+    try:
+        qwen_health_status = await asyncio.to_thread(qwen_llm.health_check)
+        qwen_health_checked_at = time.monotonic()
+    finally:
+        qwen_health_refresh = None
+    return qwen_health_status
+
+@app.on_event("shutdown")
+async def close_llm_session():
+    """关闭调用通义千问API的HTTP连接池"""
+    qwen_llm.close()
+
 @app.get("/health")
-async def health(request: Request):
+async def health(request: Request, background_tasks: BackgroundTasks):
     """健康检查"""
-    record_visit(request, "/health")
-    # 检查通义千问API
-    qwen_status = qwen_llm.health_check()
+    background_tasks.add_task(record_visit_after_response, request, "/health")
+    # 通义千问API状态 (超过有效期时才重新检查)
+    qwen_status = await get_qwen_health()
     
-    return {
+    # 直接返回响应对象，跳过 jsonable_encoder 的逐键遍历，由orjson直接序列化
+    return ORJSONResponse({
         "status": "healthy" if qwen_status["status"] == "healthy" else "degraded",
         "version": "1.0.0",
         "qwen_api": qwen_status,
-        "knowledge_items": sum(len(items) for items in knowledge_base.get("knowledge_base", {}).values())
-    }
+        "knowledge_items": KNOWLEDGE_ITEM_COUNT
+    })
+
+# /stats 响应缓存 (过期时间, JSON字节)，统计面板可以接受几秒的延迟
+STATS_CACHE_TTL = 2.0
+stats_cache = (0.0, b"")
 
 @app.get("/stats")
 async def get_stats(request: Request):
-    """获取访问统计"""
-    global access_stats
+    """获取访问统计 (缓存有效期内直接返回上次序列化的结果)"""
+    global stats_cache
     
     # 记录统计访问
     record_visit(request, "/stats")
     
+    now = time.monotonic()
+    if now >= stats_cache[0]:
+        stats_cache = (now + STATS_CACHE_TTL, ORJSONResponse(compute_stats()).body)
+    
+    return Response(content=stats_cache[1], media_type="application/json")
+
+def compute_stats() -> Dict[str, Any]:
+    """汇总访问统计"""
     # 计算今日访问量
-    today = datetime.now().date()
+    now = datetime.now()
+    today = now.date()
     today_visits = access_stats["daily_visits"].get(today, 0)
     
     # 计算昨日访问量
     yesterday = today - timedelta(days=1)
     yesterday_visits = access_stats["daily_visits"].get(yesterday, 0)
     
-    # 计算本周访问量
-    week_start = today - timedelta(days=today.weekday())
-    week_visits = sum(
-        v for d, v in access_stats["daily_visits"].items() 
-        if d >= week_start
-    )
+    # 本周访问量 (record_visit 中累加维护)
+    week_visits = access_stats["week_visits"]
     
     # 计算最活跃的小时
     most_active_hour = max(access_stats["hourly_visits"].items(), key=lambda x: x[1]) if access_stats["hourly_visits"] else (0, 0)
@@ -553,20 +948,19 @@ async def get_stats(request: Request):
         "most_popular_endpoint": most_popular_endpoint[0],
         "endpoint_stats": dict(access_stats["endpoint_stats"]),
         "daily_visits_last_7_days": {
-            str(d): v for d, v in sorted(access_stats["daily_visits"].items())[-7:]
+            str(d): access_stats["daily_visits"][d]
+            for d in access_stats["recent_days"] if d in access_stats["daily_visits"]
         },
         "hourly_distribution": dict(access_stats["hourly_visits"]),
-        "top_user_agents": dict(access_stats["user_agents"].most_common(5)),
-        "last_updated": datetime.now().isoformat()
+        "top_user_agents": dict(access_stats["user_agents"].top(5)),
+        "last_updated": now
     }
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket端点 - 支持流式输出"""
-    # 获取客户端IP
-    client_ip = websocket.client.host
-    if hasattr(websocket, 'headers') and 'x-forwarded-for' in websocket.headers:
-        client_ip = websocket.headers['x-forwarded-for'].split(',')[0].strip()
+    # 获取客户端IP (连接内后续消息直接读取 websocket.state.client_ip)
+    client_ip = get_client_ip(websocket)
     
     # 检查访问频率限制
     if not check_rate_limit(client_ip):
@@ -579,955 +973,174 @@ async def websocket_endpoint(websocket: WebSocket):
             # 接收客户端消息
             try:
                 data = await websocket.receive_text()
-                request_data = json.loads(data)
+                request_data = orjson.loads(data)
                 question = request_data.get("question", "").strip()
+                # 新版页面声明支持一帧多条消息 (缓存中的旧页面仍逐条接收)
+                jsonl = bool(request_data.get("jsonl"))
                 
                 # 输入验证
                 if not question:
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": "问题不能为空"
-                    }))
+                    await websocket.send_text(WS_ERROR_EMPTY_QUESTION)
                     continue
                 
                 if len(question) > 500:
-                    await websocket.send_text(json.dumps({
-                        "type": "error", 
-                        "message": "问题长度不能超过500字符"
-                    }))
+                    await websocket.send_text(WS_ERROR_TOO_LONG)
                     continue
                 
                 # 恶意输入检测
-                dangerous_patterns = ['<script', 'javascript:', 'eval(', 'exec(', 'import os', 'subprocess']
-                if any(pattern in question.lower() for pattern in dangerous_patterns):
-                    await websocket.send_text(json.dumps({
-                        "type": "error",
-                        "message": "输入包含不安全内容，请重新输入"
-                    }))
+                if DANGEROUS_INPUT_RE.search(question):
+                    await websocket.send_text(WS_ERROR_UNSAFE_INPUT)
                     continue
                 
                 
-                # 发送开始标记
-                await manager.send_message(json.dumps({
-                    "type": "start",
-                    "question": question
-                }), websocket)
-                
                 try:
                     # 搜索知识库
                     context_items = search_knowledge(question, limit=3)
                     
                     # 构建结构化上下文
-                    context = ""
-                    sources = []
-                    
-                    # 检查是否有高分匹配结果
-                    has_high_score = any(item.get("score", 0) >= 5 for item in context_items)
-                    
-                    # 根据匹配分数调整上下文构建
-                    for i, item in enumerate(context_items):
-                        # 获取分类名称的中文表示
-                        category_name = get_category_chinese_name(item.get("category", ""))
-                        
-                        # 构建结构化的知识条目
-                        context += f"【知识条目 {i+1}】\n"
-                        context += f"分类: {category_name}\n"
-                        
-                        # 对于FAQ类型，优先使用question作为标题
-                        if item.get("category") == "common_questions" and "question" in item:
-                            context += f"标题: {item.get('question', '')}\n"
-                        else:
-                            title = item.get('title', '')
-                            if title:
-                                context += f"标题: {title}\n"
-                        
-                        # 添加特定字段
-                        if item.get("category") == "common_questions":
-                            if "question" in item and not context.find(f"标题: {item.get('question', '')}") >= 0:
-                                context += f"问题: {item.get('question', '')}\n"
-                            if "answer" in item:
-                                context += f"回答: {item.get('answer', '')}\n"
-                        elif item.get("category") == "greetings":
-                            if "scenarios" in item:
-                                scenarios = item.get("scenarios", [])
-                                for scenario in scenarios:
-                                    if query.lower() == scenario.get("input", "").lower() or query.lower() in scenario.get("input", "").lower():
-                                        context += f"问候类型: {scenario.get('input', '')}\n"
-                                        context += f"回复: {scenario.get('response', '')}\n"
-                                        break
-                        elif item.get("category") == "contacts":
-                            if "name" in item:
-                                context += f"姓名: {item.get('name', '')}\n"
-                            if "dept" in item:
-                                context += f"部门: {item.get('dept', '')}\n"
-                            if "role" in item:
-                                context += f"职责: {item.get('role', '')}\n"
-                            if "office_location" in item:
-                                context += f"办公地点: {item.get('office_location', '')}\n"
-                        elif item.get("category") == "hospitals":
-                            if "name" in item:
-                                context += f"医院名称: {item.get('name', '')}\n"
-                            if "address" in item:
-                                context += f"医院地址: {item.get('address', '')}\n"
-                            if "phone" in item:
-                                context += f"联系电话: {item.get('phone', '')}\n"
-                            if "service_hours" in item:
-                                context += f"服务时间: {item.get('service_hours', '')}\n"
-                            if "complaint_phone" in item:
-                                context += f"投诉电话: {item.get('complaint_phone', '')}\n"
-                            if "appointment_channels" in item:
-                                context += f"预约渠道: {item.get('appointment_channels', '')}\n"
-                            if "contract_status" in item:
-                                context += f"合同状态: {item.get('contract_status', '')}\n"
-                        elif item.get("category") == "materials_requirements":
-                            if "checklist" in item:
-                                context += "所需材料清单:\n"
-                                for material in item.get("checklist", []):
-                                    context += f"- {material}\n"
-                        
-                        # 添加通用内容
-                        context += f"内容: {item.get('content', '')}\n"
-                        
-                        # 添加重要的额外字段
-                        if "ratio" in item:
-                            context += f"报销比例: {item.get('ratio', '')}\n"
-                        if "notes" in item:
-                            context += f"注意事项: {item.get('notes', '')}\n"
-                        if "tags" in item:
-                            context += f"标签: {', '.join(item.get('tags', []))}\n"
-                        
-                        # 添加分隔符
-                        context += "\n---\n\n"
-                        
-                        # 构建前端展示的来源信息
-                        sources.append({
-                            "id": item.get("id", ""),
-                            "title": item.get("title", ""),
-                            "category": category_name,
-                            "score": item.get("score", 0)
-                        })
+                    context, sources = build_rag_context(question, context_items)
                     
-                    # 发送源信息
+                    # 开始标记和源信息一并发送
                     try:
-                        await manager.send_message(json.dumps({
-                            "type": "sources",
-                            "content": sources
-                        }), websocket)
+                        await manager.send_many([
+                            {"type": "start", "question": question},
+                            {"type": "sources", "content": sources}
+                        ], websocket, jsonl)
                     except WebSocketDisconnect:
-                        print("WebSocket已断开，无法发送源信息")
+                        logger.info("WebSocket已断开，无法发送源信息")
                         break
                     
                     # 使用通义千问的流式RAG生成
-                    print(f"开始流式RAG生成回答，上下文长度: {len(context)}")
-                    async for chunk in qwen_llm.rag_generate_stream(question, context):
+                    logger.info("开始流式RAG生成回答，上下文长度: %s", len(context))
+                    async for chunk in coalesce_chunks(qwen_llm.rag_generate_stream(question, context)):
                         try:
-                            await manager.send_message(json.dumps({
+                            await manager.send_json({
                                 "type": "chunk",
                                 "content": chunk
-                            }), websocket)
+                            }, websocket)
                         except Exception as chunk_error:
-                            print(f"发送文本块时出错: {str(chunk_error)}")
+                            logger.error("发送文本块时出错: %s", chunk_error)
                             break
                     
                     # 发送完成标记
                     try:
-                        await manager.send_message(json.dumps({
+                        await manager.send_json({
                             "type": "end"
-                        }), websocket)
+                        }, websocket)
                     except Exception as end_error:
-                        print(f"发送结束标记时出错: {str(end_error)}")
+                        logger.error("发送结束标记时出错: %s", end_error)
                     
                 except Exception as e:
                     try:
-                        await manager.send_message(json.dumps({
+                        await manager.send_json({
                             "type": "error",
                             "content": f"处理问题时出错: {str(e)}"
-                        }), websocket)
+                        }, websocket)
                     except Exception:
-                        print(f"发送错误消息时出错，原始错误: {str(e)}")
+                        logger.error("发送错误消息时出错，原始错误: %s", e)
                 
             except WebSocketDisconnect:
-                print("WebSocket连接已断开")
+                logger.info("WebSocket连接已断开")
                 break
             except Exception as e:
-                print(f"处理WebSocket消息时出错: {str(e)}")
+                logger.exception("处理WebSocket消息时出错: %s", e)
                 try:
-                    await manager.send_message(json.dumps({
-                        "type": "error",
-                        "content": "服务器处理请求时出错，请刷新页面重试"
-                    }), websocket)
+                    await manager.send_message(WS_ERROR_SERVER, websocket)
                 except Exception:
-                    print("无法发送错误消息，连接可能已断开")
+                    logger.warning("无法发送错误消息，连接可能已断开")
                     break
                 
     except WebSocketDisconnect:
-        print("WebSocket连接已断开")
-        manager.disconnect(websocket)
+        logger.info("WebSocket连接已断开")
     except Exception as e:
-        print(f"WebSocket处理过程中出错: {str(e)}")
+        logger.error("WebSocket处理过程中出错: %s", e)
+    finally:
+        # 循环内 break 退出时也要移除连接
         manager.disconnect(websocket)
 
+def sse_event(payload: Dict) -> str:
+    """编码为一条SSE消息"""
+    return f"data: {orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode()}\n\n"
+
+@app.get("/api/v1/ask_stream")
+async def ask_stream(request: Request, question: str = ""):
+    """SSE流式问答 - 消息格式与WebSocket一致，逐段推送生成的回答"""
+    record_visit(request, "/api/v1/ask_stream")
+    
+    client_ip = get_client_ip(request)
+    
+    # 输入验证
+    question = question.strip()
+    error = None
+    if not check_rate_limit(client_ip):
+        error = "访问频率过高，请稍后再试"
+    elif not question:
+        error = "问题不能为空"
+    elif len(question) > 500:
+        error = "问题长度不能超过500字符"
+    elif DANGEROUS_INPUT_RE.search(question):
+        error = "输入包含不安全内容，请重新输入"
+    
+    async def event_stream():
+        if error:
+            yield sse_event({"type": "error", "message": error})
+            return
+        
+        yield sse_event({"type": "start", "question": question})
+        try:
+            context_items = search_knowledge(question, limit=3)
+            context, sources = build_rag_context(question, context_items)
+            yield sse_event({"type": "sources", "content": sources})
+            
+            async for chunk in qwen_llm.rag_generate_stream(question, context):
+                yield sse_event({"type": "chunk", "content": chunk})
+            
+            yield sse_event({"type": "end"})
+        except Exception as e:
+            yield sse_event({"type": "error", "content": f"处理问题时出错: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Web界面页面 (静态文件，启动时读取并预先压缩，请求时直接返回字节)
+WEB_HTML_PATH = Path(__file__).parent / "src" / "web" / "static" / "index.html"
+WEB_HTML_BYTES = WEB_HTML_PATH.read_bytes()
+WEB_HTML_GZIP = gzip.compress(WEB_HTML_BYTES, compresslevel=9)
+WEB_HTML_BR = brotli.compress(WEB_HTML_BYTES, quality=11) if brotli else None
+WEB_HTML_ETAG = '"' + hashlib.md5(WEB_HTML_BYTES).hexdigest() + '"'
+
+# 静态目录直接挂载，由 FileResponse (sendfile) 从页面缓存发送，支持Range请求
+# /web 仍返回预压缩的页面并记录访问统计
+app.mount("/static", StaticFiles(directory=WEB_HTML_PATH.parent), name="static")
+
 @app.get("/web", response_class=HTMLResponse)
-async def web_interface(request: Request):
+async def web_interface(request: Request, background_tasks: BackgroundTasks):
     """Web界面 - 支持Markdown渲染和流式输出"""
-    record_visit(request, "/web")
-    return """
-    <!DOCTYPE html>
-    <html lang="zh-CN">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>医疗报销智能助手</title>
-        <!-- 引入Markdown渲染库 -->
-        <script src="https://cdn.jsdelivr.net/npm/marked/marked.min.js"></script>
-        <!-- 引入代码高亮库 -->
-        <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/highlight.js@11.7.0/styles/github.css">
-        <script src="https://cdn.jsdelivr.net/npm/highlight.js@11.7.0/lib/highlight.min.js"></script>
-        <style>
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }
-            
-            body {
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            
-            .container {
-                background: white;
-                border-radius: 20px;
-                box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-                width: 90%;
-                max-width: 800px;
-                max-height: 90vh;
-                display: flex;
-                flex-direction: column;
-                overflow: hidden;
-            }
-            
-            .header {
-                background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-                color: white;
-                padding: 20px;
-                text-align: center;
-            }
-            
-            .header h1 {
-                font-size: 24px;
-                margin-bottom: 5px;
-            }
-            
-            .header p {
-                opacity: 0.9;
-                font-size: 14px;
-            }
-            
-            .chat-container {
-                flex: 1;
-                display: flex;
-                flex-direction: column;
-                min-height: 400px;
-            }
-            
-            .messages {
-                flex: 1;
-                padding: 20px;
-                overflow-y: auto;
-                max-height: 400px;
-            }
-            
-            .message {
-                margin-bottom: 15px;
-                display: flex;
-                align-items: flex-start;
-            }
-            
-            .message.user {
-                justify-content: flex-end;
-            }
-            
-            .message-content {
-                max-width: 70%;
-                padding: 12px 16px;
-                border-radius: 18px;
-                word-wrap: break-word;
-            }
-            
-            .message.user .message-content {
-                background: #007bff;
-                color: white;
-                border-bottom-right-radius: 5px;
-            }
-            
-            .message.assistant .message-content {
-                background: #f8f9fa;
-                color: #333;
-                border: 1px solid #e9ecef;
-                border-bottom-left-radius: 5px;
-            }
-            
-            /* Markdown样式 */
-            .markdown-body {
-                font-size: 14px;
-                line-height: 1.6;
-            }
-            
-            .markdown-body h1,
-            .markdown-body h2,
-            .markdown-body h3,
-            .markdown-body h4 {
-                margin-top: 16px;
-                margin-bottom: 8px;
-            }
-            
-            .markdown-body p {
-                margin-bottom: 8px;
-            }
-            
-            .markdown-body ul,
-            .markdown-body ol {
-                padding-left: 20px;
-                margin-bottom: 8px;
-            }
-            
-            .markdown-body code {
-                background: #f0f0f0;
-                padding: 2px 4px;
-                border-radius: 3px;
-                font-family: monospace;
-            }
-            
-            .markdown-body pre {
-                background: #f0f0f0;
-                padding: 10px;
-                border-radius: 5px;
-                overflow-x: auto;
-                margin-bottom: 8px;
-            }
-            
-            .markdown-body blockquote {
-                border-left: 4px solid #ddd;
-                padding-left: 10px;
-                color: #666;
-                margin-bottom: 8px;
-            }
-            
-            .markdown-body table {
-                border-collapse: collapse;
-                width: 100%;
-                margin-bottom: 8px;
-            }
-            
-            .markdown-body table th,
-            .markdown-body table td {
-                border: 1px solid #ddd;
-                padding: 6px;
-            }
-            
-            .markdown-body table th {
-                background: #f0f0f0;
-            }
-            
-            .message-time {
-                font-size: 11px;
-                opacity: 0.7;
-                margin-top: 5px;
-            }
-            
-            .sources {
-                margin-top: 10px;
-                padding: 10px;
-                background: #e3f2fd;
-                border-radius: 8px;
-                font-size: 12px;
-            }
-            
-            .sources h4 {
-                margin-bottom: 5px;
-                color: #1976d2;
-            }
-            
-            .source-item {
-                margin: 3px 0;
-                padding: 3px 6px;
-                background: white;
-                border-radius: 4px;
-                border-left: 3px solid #2196f3;
-            }
-            
-            .input-container {
-                padding: 20px;
-                border-top: 1px solid #e9ecef;
-                background: #f8f9fa;
-            }
-            
-            .input-group {
-                display: flex;
-                gap: 10px;
-            }
-            
-            .input-field {
-                flex: 1;
-                padding: 12px 16px;
-                border: 2px solid #e9ecef;
-                border-radius: 25px;
-                font-size: 14px;
-                outline: none;
-                transition: border-color 0.3s;
-            }
-            
-            .input-field:focus {
-                border-color: #007bff;
-            }
-            
-            .send-button {
-                padding: 12px 24px;
-                background: #007bff;
-                color: white;
-                border: none;
-                border-radius: 25px;
-                cursor: pointer;
-                font-size: 14px;
-                font-weight: 500;
-                transition: background 0.3s;
-            }
-            
-            .send-button:hover:not(:disabled) {
-                background: #0056b3;
-            }
-            
-            .send-button:disabled {
-                background: #6c757d;
-                cursor: not-allowed;
-            }
-            
-            .loading {
-                display: none;
-                text-align: center;
-                padding: 20px;
-                color: #6c757d;
-            }
-            
-            .loading.show {
-                display: block;
-            }
-            
-            .typing-indicator {
-                display: inline-flex;
-                align-items: center;
-                gap: 4px;
-            }
-            
-            .typing-dot {
-                width: 8px;
-                height: 8px;
-                background: #007bff;
-                border-radius: 50%;
-                animation: typing 1.4s infinite;
-            }
-            
-            .typing-dot:nth-child(2) {
-                animation-delay: 0.2s;
-            }
-            
-            .typing-dot:nth-child(3) {
-                animation-delay: 0.4s;
-            }
-            
-            @keyframes typing {
-                0%, 60%, 100% {
-                    transform: translateY(0);
-                }
-                30% {
-                    transform: translateY(-10px);
-                }
-            }
-            
-            .quick-questions {
-                padding: 15px 20px;
-                background: #f8f9fa;
-                border-top: 1px solid #e9ecef;
-            }
-            
-            .quick-questions h4 {
-                margin-bottom: 10px;
-                color: #495057;
-                font-size: 14px;
-            }
-            
-            .quick-buttons {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 8px;
-            }
-            
-            .quick-button {
-                padding: 6px 12px;
-                background: white;
-                border: 1px solid #dee2e6;
-                border-radius: 15px;
-                cursor: pointer;
-                font-size: 12px;
-                color: #495057;
-                transition: all 0.3s;
-            }
-            
-            .quick-button:hover {
-                background: #007bff;
-                color: white;
-                border-color: #007bff;
-            }
-            
-            @media (max-width: 600px) {
-                .container {
-                    width: 95%;
-                    margin: 10px;
-                }
-                
-                .message-content {
-                    max-width: 85%;
-                }
-                
-                .input-group {
-                    flex-direction: column;
-                }
-                
-                .send-button {
-                    align-self: flex-end;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🏥 医疗报销智能助手</h1>
-                <p>北京交通大学威海校区 | 通义千问驱动</p>
-            </div>
-            
-            <div class="chat-container">
-                <div class="messages" id="messages">
-                    <div class="message assistant">
-                        <div class="message-content">
-                            <div class="markdown-body">👋 您好！我是医疗报销智能助手，由通义千问大模型驱动。我可以为您解答关于北京交通大学威海校区医疗报销的各种问题。</div>
-                            <div class="message-time" id="welcome-time"></div>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="loading" id="loading">
-                    <div class="typing-indicator">
-                        <span>AI正在思考</span>
-                        <div class="typing-dot"></div>
-                        <div class="typing-dot"></div>
-                        <div class="typing-dot"></div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="quick-questions">
-                <h4>💡 常见问题</h4>
-                <div class="quick-buttons">
-                    <button class="quick-button" onclick="askQuestion('感冒药能报销吗？')">感冒药能报销吗？</button>
-                    <button class="quick-button" onclick="askQuestion('住院需要什么材料？')">住院需要什么材料？</button>
-                    <button class="quick-button" onclick="askQuestion('报销找哪个老师？')">报销找哪个老师？</button>
-                    <button class="quick-button" onclick="askQuestion('威海市中心医院地址在哪？')">威海市中心医院地址在哪？</button>
-                </div>
-            </div>
-            
-            <div class="input-container">
-                <div class="input-group">
-                    <input 
-                        type="text" 
-                        class="input-field" 
-                        id="questionInput" 
-                        placeholder="请输入您的问题..."
-                        maxlength="500"
-                    >
-                    <button class="send-button" id="sendButton" onclick="sendMessage()">
-                        发送
-                    </button>
-                </div>
-            </div>
-        </div>
-
-        <script>
-            // 初始化WebSocket连接
-            let socket = null;
-            let currentMessageDiv = null;
-            let currentMessageContent = "";
-            
-            // 连接WebSocket
-            function connectWebSocket() {
-                const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-                const wsUrl = `${protocol}//${window.location.host}/ws`;
-                
-                socket = new WebSocket(wsUrl);
-                
-                socket.onopen = function(e) {
-                    console.log("WebSocket连接已建立");
-                    // 连接成功时启用发送按钮
-                    document.getElementById('sendButton').disabled = false;
-                    document.getElementById('sendButton').textContent = '发送';
-                    
-                    // 移除连接状态指示器
-                    const connectionStatus = document.getElementById('connection-status');
-                    if (connectionStatus) {
-                        connectionStatus.remove();
-                    }
-                    
-                    // 如果之前显示了连接错误，现在移除
-                    const connectionError = document.getElementById('connection-error');
-                    if (connectionError) {
-                        connectionError.remove();
-                    }
-                    
-                    // 确保加载状态隐藏
-                    showLoading(false);
-                };
-                
-                socket.onmessage = function(event) {
-                    const data = JSON.parse(event.data);
-                    handleWebSocketMessage(data);
-                };
-                
-                socket.onclose = function(event) {
-                    console.log("WebSocket连接已关闭");
-                    // 禁用发送按钮
-                    document.getElementById('sendButton').disabled = true;
-                    
-                    // 显示连接错误消息
-                    showConnectionError("连接已断开，正在尝试重新连接...");
-                    
-                    // 隐藏加载状态
-                    showLoading(false);
-                    
-                    // 尝试重新连接
-                    setTimeout(connectWebSocket, 2000);
-                };
-                
-                socket.onerror = function(error) {
-                    console.error("WebSocket错误:", error);
-                    // 显示连接错误消息
-                    showConnectionError("连接出错，请稍后再试...");
-                    
-                    // 隐藏加载状态
-                    showLoading(false);
-                };
-            }
-            
-            // 显示连接错误消息
-            function showConnectionError(message) {
-                // 检查是否已存在错误消息
-                let errorDiv = document.getElementById('connection-error');
-                
-                if (!errorDiv) {
-                    // 创建错误消息
-                    errorDiv = document.createElement('div');
-                    errorDiv.id = 'connection-error';
-                    errorDiv.style.backgroundColor = '#ffebee';
-                    errorDiv.style.color = '#d32f2f';
-                    errorDiv.style.padding = '10px';
-                    errorDiv.style.margin = '10px 0';
-                    errorDiv.style.borderRadius = '5px';
-                    errorDiv.style.textAlign = 'center';
-                    errorDiv.style.fontSize = '14px';
-                    
-                    // 添加到消息容器顶部
-                    const messagesContainer = document.getElementById('messages');
-                    messagesContainer.insertBefore(errorDiv, messagesContainer.firstChild);
-                }
-                
-                // 设置错误消息
-                errorDiv.textContent = message;
-            }
-            
-            // 处理WebSocket消息
-            function handleWebSocketMessage(data) {
-                console.log("收到WebSocket消息:", data.type);
-                
-                switch(data.type) {
-                    case "start":
-                        // 创建新的消息容器
-                        currentMessageDiv = document.createElement('div');
-                        currentMessageDiv.className = "message assistant";
-                        currentMessageContent = "";
-                        
-                        const contentDiv = document.createElement('div');
-                        contentDiv.className = "message-content";
-                        
-                        const markdownDiv = document.createElement('div');
-                        markdownDiv.className = "markdown-body";
-                        markdownDiv.id = "current-markdown";
-                        
-                        contentDiv.appendChild(markdownDiv);
-                        currentMessageDiv.appendChild(contentDiv);
-                        
-                        document.getElementById('messages').appendChild(currentMessageDiv);
-                        showLoading(true);
-                        break;
-                        
-                    case "chunk":
-                        // 追加文本块
-                        if (!document.getElementById("current-markdown")) {
-                            console.error("找不到当前Markdown容器");
-                            // 如果找不到当前的Markdown容器，可能是因为连接断开后重连
-                            // 在这种情况下，我们需要创建一个新的消息容器
-                            handleWebSocketMessage({type: "start"});
-                        }
-                        
-                        currentMessageContent += data.content;
-                        try {
-                            document.getElementById("current-markdown").innerHTML = marked.parse(currentMessageContent);
-                            // 应用代码高亮
-                            document.querySelectorAll('pre code').forEach((block) => {
-                                hljs.highlightBlock(block);
-                            });
-                            
-                            // 滚动到底部
-                            const messagesContainer = document.getElementById('messages');
-                            messagesContainer.scrollTop = messagesContainer.scrollHeight;
-                        } catch (error) {
-                            console.error("渲染Markdown时出错:", error);
-                        }
-                        break;
-                        
-                    case "sources":
-                        // 添加来源信息
-                        if (currentMessageDiv && data.content && data.content.length > 0) {
-                            const messageContent = currentMessageDiv.querySelector('.message-content');
-                            
-                            const sourcesDiv = document.createElement('div');
-                            sourcesDiv.className = "sources";
-                            
-                            const sourcesTitle = document.createElement('h4');
-                            sourcesTitle.textContent = "📚 信息来源";
-                            sourcesDiv.appendChild(sourcesTitle);
-                            
-                            data.content.forEach(source => {
-                                const sourceItem = document.createElement('div');
-                                sourceItem.className = "source-item";
-                                sourceItem.textContent = `${source.title} (${source.category})`;
-                                sourcesDiv.appendChild(sourceItem);
-                            });
-                            
-                            messageContent.appendChild(sourcesDiv);
-                        }
-                        break;
-                        
-                    case "end":
-                        // 完成消息，添加时间戳
-                        if (currentMessageDiv) {
-                            const messageContent = currentMessageDiv.querySelector('.message-content');
-                            
-                            const timeDiv = document.createElement('div');
-                            timeDiv.className = "message-time";
-                            timeDiv.textContent = new Date().toLocaleTimeString();
-                            
-                            messageContent.appendChild(timeDiv);
-                            
-                            // 移除当前ID
-                            const markdownDiv = document.getElementById("current-markdown");
-                            if (markdownDiv) {
-                                markdownDiv.removeAttribute("id");
-                            }
-                            
-                            currentMessageDiv = null;
-                            showLoading(false);
-                        } else {
-                            // 如果没有当前消息容器，也要确保加载状态被隐藏
-                            showLoading(false);
-                        }
-                        break;
-                        
-                    case "error":
-                        // 显示错误消息
-                        addMessage(data.content, 'assistant');
-                        showLoading(false);
-                        break;
-                        
-                    default:
-                        console.warn("未知的消息类型:", data.type);
-                        showLoading(false);
-                }
-            }
-            
-            // 设置欢迎时间
-            document.getElementById('welcome-time').textContent = new Date().toLocaleTimeString();
-            
-            // 连接WebSocket
-            connectWebSocket();
-            
-            // 回车发送消息
-            document.getElementById('questionInput').addEventListener('keypress', function(e) {
-                if (e.key === 'Enter') {
-                    sendMessage();
-                }
-            });
-            
-            // 快速提问
-            function askQuestion(question) {
-                document.getElementById('questionInput').value = question;
-                sendMessage();
-            }
-            
-            // 发送消息
-            function sendMessage() {
-                const input = document.getElementById('questionInput');
-                const question = input.value.trim();
-                
-                if (!question) {
-                    return; // 空问题不处理
-                }
-                
-                if (!socket || socket.readyState !== WebSocket.OPEN) {
-                    // 如果WebSocket未连接，显示错误
-                    showConnectionError("服务器连接已断开，请刷新页面重试");
-                    return;
-                }
-                
-                // 清空输入框
-                input.value = '';
-                
-                // 添加用户消息
-                addMessage(question, 'user');
-                
-                // 立即显示加载状态，提供即时反馈
-                showLoading(true);
-                
-                try {
-                    // 发送到WebSocket
-                    socket.send(JSON.stringify({
-                        question: question
-                    }));
-                } catch (error) {
-                    console.error("发送消息失败:", error);
-                    showLoading(false);
-                    showConnectionError("发送消息失败，请刷新页面重试");
-                }
-            }
-            
-            // 添加消息到聊天界面
-            function addMessage(content, type) {
-                const messagesContainer = document.getElementById('messages');
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${type}`;
-                
-                const contentDiv = document.createElement('div');
-                contentDiv.className = "message-content";
-                
-                if (type === 'user') {
-                    contentDiv.textContent = content;
-                } else {
-                    const markdownDiv = document.createElement('div');
-                    markdownDiv.className = "markdown-body";
-                    markdownDiv.innerHTML = marked.parse(content);
-                    contentDiv.appendChild(markdownDiv);
-                }
-                
-                const timeDiv = document.createElement('div');
-                timeDiv.className = "message-time";
-                timeDiv.textContent = new Date().toLocaleTimeString();
-                contentDiv.appendChild(timeDiv);
-                
-                messageDiv.appendChild(contentDiv);
-                messagesContainer.appendChild(messageDiv);
-                
-                // 滚动到底部
-                messagesContainer.scrollTop = messagesContainer.scrollHeight;
-            }
-            
-            // 显示/隐藏加载状态
-            function showLoading(show) {
-                const loading = document.getElementById('loading');
-                const sendButton = document.getElementById('sendButton');
-                
-                if (show) {
-                    loading.classList.add('show');
-                    sendButton.disabled = true;
-                    sendButton.textContent = '发送中...';
-                } else {
-                    loading.classList.remove('show');
-                    sendButton.disabled = false;
-                    sendButton.textContent = '发送';
-                }
-            }
-            
-            // 初始化WebSocket连接
-            function initWebSocket() {
-                // 初始WebSocket连接前禁用发送按钮
-                document.getElementById('sendButton').disabled = true;
-                document.getElementById('sendButton').textContent = '连接中...';
-                
-                // 创建专门的连接状态指示器
-                const messagesContainer = document.getElementById('messages');
-                let connectionStatus = document.getElementById('connection-status');
-                
-                // 如果已存在则更新，否则创建新的
-                if (!connectionStatus) {
-                    connectionStatus = document.createElement('div');
-                    connectionStatus.id = 'connection-status';
-                    connectionStatus.style.textAlign = 'center';
-                    connectionStatus.style.padding = '10px';
-                    connectionStatus.style.margin = '10px 0';
-                    connectionStatus.style.color = '#666';
-                    connectionStatus.style.fontSize = '14px';
-                    connectionStatus.style.backgroundColor = '#f0f8ff';
-                    connectionStatus.style.borderRadius = '5px';
-                    messagesContainer.appendChild(connectionStatus);
-                }
-                
-                connectionStatus.textContent = '正在连接服务器...';
-                
-                // 建立WebSocket连接
-                connectWebSocket();
-                
-                // 5秒后检查连接状态
-                setTimeout(function() {
-                    if (!socket || socket.readyState !== WebSocket.OPEN) {
-                        connectionStatus = document.getElementById('connection-status');
-                        if (connectionStatus) {
-                            connectionStatus.textContent = '连接服务器超时，正在重试...';
-                            connectionStatus.style.backgroundColor = '#fff3cd';
-                            connectionStatus.style.color = '#856404';
-                        }
-                    }
-                }, 5000);
-            }
-            
-            // 页面加载完成后聚焦输入框
-            window.addEventListener('load', function() {
-                document.getElementById('questionInput').focus();
-                
-                // 初始化WebSocket
-                initWebSocket();
-                
-                // 初始化Markdown渲染器
-                marked.setOptions({
-                    renderer: new marked.Renderer(),
-                    highlight: function(code, language) {
-                        const validLanguage = hljs.getLanguage(language) ? language : 'plaintext';
-                        return hljs.highlight(validLanguage, code).value;
-                    },
-                    pedantic: false,
-                    gfm: true,
-                    breaks: true,
-                    sanitize: false,
-                    smartLists: true,
-                    smartypants: false,
-                    xhtml: false
-                });
-            });
-        </script>
-    </body>
-    </html>
-    """
+    background_tasks.add_task(record_visit_after_response, request, "/web")
+    headers = {
+        "ETag": WEB_HTML_ETAG,
+        "Cache-Control": "public, max-age=3600",
+        "Vary": "Accept-Encoding"
+    }
+    
+    # 浏览器已缓存相同版本
+    if request.headers.get("if-none-match") == WEB_HTML_ETAG:
+        return Response(status_code=304, headers=headers)
+    
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if WEB_HTML_BR is not None and "br" in accept_encoding:
+        content = WEB_HTML_BR
+        headers["Content-Encoding"] = "br"
+    elif "gzip" in accept_encoding:
+        content = WEB_HTML_GZIP
+        headers["Content-Encoding"] = "gzip"
+    else:
+        content = WEB_HTML_BYTES
+    
+    return Response(content=content, media_type="text/html; charset=utf-8", headers=headers)
 
 if __name__ == "__main__":
     print("🏥 医疗报销智能助手 - 通义千问流式版启动")
@@ -1543,9 +1156,17 @@ if __name__ == "__main__":
     print("💡 按 Ctrl+C 停止服务")
     print("")
     
+    # 工作进程数 (访问统计和限流保存在进程内存中，多进程时按进程分别计数)
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+    
     uvicorn.run(
-        app,
+        app if WORKERS == 1 else "qwen_stream_app:app",
         host="0.0.0.0",
         port=PORT,
+        workers=WORKERS,
+        # auto: 已安装 uvloop/httptools 时自动使用，未安装的平台 (如Windows) 回退到标准实现
+        loop="auto",
+        http="auto",
+        access_log=False,
         log_level="info"
     )
@@ -0,0 +1,34 @@
+"""
+日志配置 - 日志经队列交给后台线程写出，避免在事件循环中同步写stdout
+"""
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: str = "INFO") -> None:
+    """配置根日志器 (重复调用无副作用)
+
+    请求处理中调用 logger.info 等只是把记录放入队列，
+    由 QueueListener 的后台线程负责格式化并写到stdout。
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(-1)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    # 进程退出前把队列中剩余的日志写完
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level.upper())
@@ -18,10 +18,12 @@ class Settings(BaseSettings):
     # 服务器配置
     host: str = Field(default="0.0.0.0", env="HOST")
     port: int = Field(default=8080, env="PORT")
+    workers: int = Field(default=1, env="WEB_CONCURRENCY")
     
     # API配置
     api_prefix: str = "/api/v1"
     cors_origins: list = ["*"]
+    response_gzip_min_size: int = Field(default=512, env="RESPONSE_GZIP_MIN_SIZE")
     
     # 通义千问配置
     dashscope_api_key: str = Field(..., env="DASHSCOPE_API_KEY")
@@ -31,6 +33,10 @@ class Settings(BaseSettings):
     rag_engine: str = Field(default="qwen", env="RAG_ENGINE")
     max_context_length: int = Field(default=4000, env="MAX_CONTEXT_LENGTH")
     top_k_documents: int = Field(default=5, env="TOP_K_DOCUMENTS")
+    full_context_enabled: bool = Field(default=True, env="FULL_CONTEXT_ENABLED")
+    embedding_model: str = Field(default="text-embedding-v2", env="EMBEDDING_MODEL")
+    embedding_batch_size: int = Field(default=16, env="EMBEDDING_BATCH_SIZE")
+    embedding_batch_wait_ms: float = Field(default=10, env="EMBEDDING_BATCH_WAIT_MS")
     
     # 知识库配置
     knowledge_source: str = Field(default="json", env="KNOWLEDGE_SOURCE")
@@ -39,6 +45,14 @@ class Settings(BaseSettings):
     # 缓存配置 (扩展预留)
     redis_url: Optional[str] = Field(default=None, env="REDIS_URL")
     cache_ttl: int = Field(default=3600, env="CACHE_TTL")
+    response_cache_size: int = Field(default=1024, env="RESPONSE_CACHE_SIZE")
+    response_cache_db: Optional[str] = Field(default=None, env="RESPONSE_CACHE_DB")
+    # 语义缓存默认关闭：每次精确缓存未命中都要多一次向量化调用，且相近问题可能得到不适用的回答
+    semantic_cache_enabled: bool = Field(default=False, env="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_size: int = Field(default=512, env="SEMANTIC_CACHE_SIZE")
+    semantic_cache_threshold: float = Field(default=0.92, env="SEMANTIC_CACHE_THRESHOLD")
+    # 启动时预热快捷问题 (每个进程都会调用大模型，默认关闭)
+    quick_questions_warmup: bool = Field(default=False, env="QUICK_QUESTIONS_WARMUP")
     
     # 数据库配置 (扩展预留)
     database_url: Optional[str] = Field(default=None, env="DATABASE_URL")
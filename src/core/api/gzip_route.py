@@ -0,0 +1,42 @@
+"""
+路由级gzip压缩 - 只压缩较大的JSON响应
+"""
+import gzip
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from ...config.settings import settings
+
+class GZipRoute(APIRoute):
+    """对超过阈值的JSON响应进行gzip压缩
+
+    按路由生效而非全局中间件：HTML页面已自行预压缩，流式响应也不应被缓冲，
+    这里只处理问答等一次性返回的JSON结果。
+    """
+
+    compress_level = 6
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def gzip_route_handler(request: Request) -> Response:
+            response = await route_handler(request)
+
+            body = getattr(response, "body", None)
+            if (
+                body
+                and len(body) >= settings.response_gzip_min_size
+                and response.media_type == "application/json"
+                and "content-encoding" not in response.headers
+                and "gzip" in request.headers.get("accept-encoding", "")
+            ):
+                response.body = gzip.compress(body, compresslevel=self.compress_level)
+                response.headers["Content-Encoding"] = "gzip"
+                response.headers["Content-Length"] = str(len(response.body))
+                response.headers["Vary"] = "Accept-Encoding"
+
+            return response
+
+        return gzip_route_handler
@@ -1,7 +1,7 @@
 """
 API数据模型
 """
-from typing import List, Optional, Dict, Any
+from typing import Annotated, List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -11,13 +11,33 @@ class QuestionRequest(BaseModel):
     session_id: Optional[str] = Field(None, description="会话ID")
     context: Optional[str] = Field(None, description="上下文信息")
 
+class SourceItem(BaseModel):
+    """回答来源模型"""
+    id: str = Field(..., description="知识项ID")
+    title: str = Field(..., description="知识项标题")
+    category: str = Field(default="", description="分类")
+    score: float = Field(default=0, description="匹配分数")
+
 class AnswerResponse(BaseModel):
     """回答响应模型"""
     answer: str = Field(..., description="AI生成的回答")
-    sources: List[Dict[str, Any]] = Field(default=[], description="信息来源")
+    sources: List[SourceItem] = Field(default=[], description="信息来源")
     session_id: str = Field(..., description="会话ID")
     response_time: float = Field(..., description="响应时间(秒)")
     timestamp: datetime = Field(default_factory=datetime.now, description="响应时间戳")
+    error: Optional[str] = Field(None, description="错误信息 (批量问答中该问题处理失败时)")
+
+class BatchQuestionRequest(BaseModel):
+    """批量问答请求模型"""
+    questions: List[Annotated[str, Field(min_length=1, max_length=500)]] = Field(
+        ..., description="用户问题列表", min_length=1, max_length=20
+    )
+    session_id: Optional[str] = Field(None, description="会话ID")
+
+class BatchAnswerResponse(BaseModel):
+    """批量问答响应模型"""
+    answers: List[AnswerResponse] = Field(..., description="与问题顺序一致的回答列表")
+    response_time: float = Field(..., description="响应时间(秒)")
 
 class HealthResponse(BaseModel):
     """健康检查响应模型"""
@@ -1,28 +1,118 @@
 """
 API路由定义
 """
+import re
 import time
 import uuid
-from typing import Dict, Any
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Any, List
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 
+from .gzip_route import GZipRoute
 from .models import (
     QuestionRequest, AnswerResponse, HealthResponse,
+    BatchQuestionRequest, BatchAnswerResponse,
     KnowledgeSearchRequest, KnowledgeSearchResponse, ErrorResponse,
     KnowledgeItemRequest, KnowledgeItemResponse, KnowledgeItemUpdateRequest
 )
 from ..rag.qwen_engine import QwenRAGEngine
 from ..knowledge.json_manager import JSONKnowledgeManager
-from ...config.settings import settings
+from ..cache.response_cache import ResponseCache
+from ..cache.semantic_cache import SemanticCache
+from ...config.settings import settings, PROJECT_ROOT
 
-# 创建路由器
-router = APIRouter(prefix=settings.api_prefix)
+logger = logging.getLogger(__name__)
+
+# 创建路由器 (JSON响应使用 orjson 序列化，较大的响应按需gzip压缩)
+router = APIRouter(
+    prefix=settings.api_prefix,
+    default_response_class=ORJSONResponse,
+    route_class=GZipRoute
+)
 
 # 全局实例 (生产环境建议使用依赖注入)
 rag_engine: QwenRAGEngine = None
 knowledge_manager: JSONKnowledgeManager = None
 
+def knowledge_base_version() -> str:
+    """知识库版本 (知识库文件的修改时间和大小)，任一进程修改知识库后版本随之变化"""
+    path = knowledge_manager.file_path if knowledge_manager is not None else PROJECT_ROOT / settings.knowledge_path
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+# 问答响应缓存 (相同问题直接返回，跳过检索和生成；知识库版本变化或超过有效期后失效)
+response_cache = ResponseCache(
+    max_size=settings.response_cache_size,
+    db_path=settings.response_cache_db,
+    ttl=settings.cache_ttl,
+    version=knowledge_base_version
+)
+
+# 语义缓存 (表述不同但含义相近的问题复用回答)
+semantic_cache = SemanticCache(
+    max_size=settings.semantic_cache_size,
+    threshold=settings.semantic_cache_threshold
+)
+
+# Web界面模板：快捷按钮的问题只在模板中维护，预热时从模板读取
+WEB_TEMPLATE_PATH = PROJECT_ROOT / "src" / "web" / "templates" / "index.html"
+QUICK_BUTTON_RE = re.compile(r'class="quick-button" onclick="askQuestion\(\'([^\']+)\'\)"')
+quick_warmup_task: asyncio.Task = None
+
+@router.on_event("startup")
+async def load_response_cache():
+    """启动时加载持久化的响应缓存"""
+    global quick_warmup_task
+    loaded = response_cache.load()
+    if loaded:
+        logger.info("已加载 %s 条缓存响应", loaded)
+    
+    if settings.quick_questions_warmup and quick_warmup_task is None:
+        quick_warmup_task = asyncio.create_task(warm_quick_questions())
+
+def load_quick_questions(path: Path = WEB_TEMPLATE_PATH) -> List[str]:
+    """从Web界面模板读取快捷按钮的问题"""
+    try:
+        return QUICK_BUTTON_RE.findall(path.read_text(encoding="utf-8"))
+    except OSError as e:
+        logger.warning("读取快捷问题失败: %s", e)
+        return []
+
+async def warm_quick_questions():
+    """预先生成快捷问题的回答并写入缓存，点击快捷按钮时直接命中"""
+    rag_engine = await get_rag_engine()
+    knowledge_manager = await get_knowledge_manager()
+    
+    for question in load_quick_questions():
+        if response_cache.get(question) is not None:
+            continue
+        try:
+            await ask_question(QuestionRequest(question=question), rag_engine, knowledge_manager)
+        except Exception as e:
+            logger.warning("快捷问题预热失败: %s - %s", question, e)
+
+def invalidate_answer_caches():
+    """知识库内容变更后清空问答缓存，避免继续返回基于旧知识的回答"""
+    response_cache.clear()
+    semantic_cache.clear()
+
+@router.on_event("shutdown")
+async def close_response_cache():
+    """关闭响应缓存"""
+    response_cache.close()
+
+@router.on_event("shutdown")
+async def stop_embedding_batcher():
+    """停止向量化合批任务"""
+    if rag_engine is not None:
+        await rag_engine.embedding_batcher.stop()
+
 async def get_rag_engine() -> QwenRAGEngine:
     """获取RAG引擎实例"""
     global rag_engine
@@ -81,9 +171,27 @@ async def ask_question(
     knowledge_manager: JSONKnowledgeManager = Depends(get_knowledge_manager)
 ):
     """智能问答接口"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     session_id = request.session_id or str(uuid.uuid4())
     
+    # 命中缓存时直接返回
+    cached = response_cache.get(request.question)
+    question_vector = None
+    if cached is None and settings.semantic_cache_enabled:
+        try:
+            question_vector = await rag_engine.embedding_batcher.embed(request.question)
+            cached = semantic_cache.lookup(question_vector)
+        except Exception as e:
+            logger.warning("语义缓存查询失败: %s", e)
+    
+    if cached is not None:
+        return AnswerResponse(
+            answer=cached["answer"],
+            sources=cached["sources"],
+            session_id=session_id,
+            response_time=time.perf_counter() - start_time
+        )
+    
     try:
         # 1. 从知识库搜索相关文档
         knowledge_items = await knowledge_manager.search(
@@ -91,52 +199,35 @@ async def ask_question(
             limit=settings.top_k_documents
         )
         
-        # 2. 转换为RAG文档格式
-        from ..rag.base import Document
-        documents = []
-        for item in knowledge_items:
-            doc = Document(
-                id=item.id,
-                title=item.title,
-                content=item.content,
-                metadata={
-                    "category": item.category,
-                    "tags": item.tags,
-                    **item.metadata
-                }
-            )
-            documents.append(doc)
-        
-        # 3. 添加到RAG引擎
-        if documents:
-            await rag_engine.add_documents(documents)
-        
-        # 4. 搜索相关文档
-        search_result = await rag_engine.search(
-            query=request.question,
-            top_k=settings.top_k_documents
-        )
-        
-        # 5. 构建上下文
-        context = ""
+        # 2. 一次遍历同时构建上下文和来源
+        context_parts = []
         sources = []
-        for doc in search_result.documents:
-            context += f"标题: {doc.title}\n内容: {doc.content}\n\n"
+        for item in knowledge_items:
+            context_parts.append(f"标题: {item.title}\n内容: {item.content}\n\n")
             sources.append({
-                "id": doc.id,
-                "title": doc.title,
-                "category": doc.metadata.get("category", ""),
-                "score": doc.score
+                "id": item.id,
+                "title": item.title,
+                "category": item.category,
+                "score": item.metadata.get("search_score", 0)
             })
+        context = "".join(context_parts)
+        
+        # 知识库较小时整体放入上下文：提示词前缀固定不变，可命中模型服务端的上下文缓存
+        if settings.full_context_enabled and 0 < len(knowledge_manager.full_context) <= settings.max_context_length:
+            context = knowledge_manager.full_context
         
-        # 6. 生成回答
+        # 3. 生成回答
         answer = await rag_engine.llm_provider.generate(
             prompt=request.question,
             context=context,
             max_tokens=settings.max_context_length
         )
         
-        response_time = time.time() - start_time
+        response_cache.set(request.question, {"answer": answer, "sources": sources})
+        if question_vector is not None:
+            semantic_cache.add(question_vector, {"answer": answer, "sources": sources})
+        
+        response_time = time.perf_counter() - start_time
         
         return AnswerResponse(
             answer=answer,
@@ -151,13 +242,50 @@ async def ask_question(
             detail=f"问答失败: {str(e)}"
         )
 
+@router.post("/ask_batch", response_model=BatchAnswerResponse)
+async def ask_questions_batch(
+    request: BatchQuestionRequest,
+    rag_engine: QwenRAGEngine = Depends(get_rag_engine),
+    knowledge_manager: JSONKnowledgeManager = Depends(get_knowledge_manager)
+):
+    """批量问答接口 - 并发处理多个问题，向量化请求自动合批"""
+    start_time = time.perf_counter()
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    results = await asyncio.gather(*[
+        ask_question(
+            QuestionRequest(question=question, session_id=session_id),
+            rag_engine,
+            knowledge_manager
+        )
+        for question in request.questions
+    ], return_exceptions=True)
+    
+    # 单个问题失败时只在对应位置返回错误，不影响其他已完成的回答
+    answers = []
+    for result in results:
+        if isinstance(result, BaseException):
+            error = result.detail if isinstance(result, HTTPException) else f"问答失败: {str(result)}"
+            result = AnswerResponse(
+                answer=error,
+                session_id=session_id,
+                response_time=time.perf_counter() - start_time,
+                error=error
+            )
+        answers.append(result)
+    
+    return BatchAnswerResponse(
+        answers=answers,
+        response_time=time.perf_counter() - start_time
+    )
+
 @router.post("/search", response_model=KnowledgeSearchResponse)
 async def search_knowledge(
     request: KnowledgeSearchRequest,
     knowledge_manager: JSONKnowledgeManager = Depends(get_knowledge_manager)
 ):
     """知识库搜索接口"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     try:
         # 搜索知识库
@@ -181,7 +309,7 @@ async def search_knowledge(
                 "updated_at": item.updated_at
             })
         
-        search_time = time.time() - start_time
+        search_time = time.perf_counter() - start_time
         
         return KnowledgeSearchResponse(
             items=search_results,
@@ -237,8 +365,9 @@ async def create_knowledge_item(
     try:
         from ..knowledge.base import KnowledgeItem
         
-        # 创建知识项
+        # 创建知识项 (ID留空，由知识库管理器生成)
         item = KnowledgeItem(
+            id="",
             category=request.category,
             title=request.title,
             content=request.content,
@@ -250,6 +379,7 @@ async def create_knowledge_item(
         success = await knowledge_manager.add_item(item)
         if not success:
             raise HTTPException(status_code=500, detail="创建条目失败")
+        invalidate_answer_caches()
         
         return KnowledgeItemResponse(
             id=item.id,
@@ -327,6 +457,7 @@ async def update_knowledge_item(
         success = await knowledge_manager.update_item(item)
         if not success:
             raise HTTPException(status_code=500, detail="更新条目失败")
+        invalidate_answer_caches()
         
         return KnowledgeItemResponse(
             id=item.id,
@@ -357,6 +488,7 @@ async def delete_knowledge_item(
         success = await knowledge_manager.delete_item(item_id)
         if not success:
             raise HTTPException(status_code=404, detail="条目不存在")
+        invalidate_answer_caches()
         
         return {"message": "条目删除成功", "item_id": item_id}
         
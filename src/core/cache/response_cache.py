@@ -0,0 +1,171 @@
+"""
+问答响应缓存 - 进程内LRU (可选过期时间) + 可选SQLite持久化
+"""
+import copy
+import json
+import time
+import logging
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """问答响应缓存 (按规范化后的问题精确匹配)"""
+    
+    def __init__(self, max_size: int = 1024, db_path: Optional[str] = None,
+                 ttl: Optional[float] = None, version: Optional[Callable[[], str]] = None):
+        """
+        初始化响应缓存
+        
+        Args:
+            max_size: 最多保留的条目数 (内存和SQLite相同)，超出后淘汰最久未使用/最早写入的条目
+            db_path: SQLite持久化文件路径，为None时只使用内存缓存
+            ttl: 条目的有效期(秒)，同时作用于持久化的条目，为None时不过期
+            version: 返回当前知识库版本的函数，版本变化后此前缓存的响应全部失效
+        """
+        self.max_size = max_size
+        self.db_path = db_path
+        self.ttl = ttl
+        self.version = version
+        self._version = version() if version is not None else ""
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._expires: Dict[str, float] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    @staticmethod
+    def make_key(question: str) -> str:
+        """规范化问题文本作为缓存键"""
+        return question.strip().lower()
+    
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，命中时返回响应副本"""
+        self._check_version()
+        key = self.make_key(question)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        if self.ttl is not None and time.monotonic() >= self._expires[key]:
+            del self._entries[key]
+            del self._expires[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry)
+    
+    def set(self, question: str, payload: Dict[str, Any]) -> None:
+        """写入缓存 (同时写穿到SQLite，并删除超出容量的旧条目)"""
+        self._check_version()
+        key = self.make_key(question)
+        self._put(key, copy.deepcopy(payload))
+        
+        if self._conn is not None:
+            try:
+                # INSERT OR REPLACE 会分配新的rowid，rowid越大写入越晚
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, payload, version, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                     self._version, time.time())
+                )
+                self._conn.execute(
+                    "DELETE FROM response_cache WHERE rowid NOT IN "
+                    "(SELECT rowid FROM response_cache ORDER BY rowid DESC LIMIT ?)",
+                    (self.max_size,)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("写入响应缓存失败: %s", e)
+    
+    def load(self) -> int:
+        """从SQLite加载已持久化的响应，返回加载条目数 (过期和旧知识库版本的条目直接删除)"""
+        if not self.db_path:
+            return 0
+        
+        now = time.time()
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(response_cache)")}
+            if columns and not {"version", "created_at"} <= columns:
+                # 旧版本的表没有知识库版本和写入时间，无法判断是否过期，整表丢弃
+                self._conn.execute("DROP TABLE response_cache")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, payload BLOB, version TEXT, created_at REAL)"
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE version != ?", (self._version,))
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM response_cache WHERE created_at <= ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE rowid NOT IN "
+                "(SELECT rowid FROM response_cache ORDER BY rowid DESC LIMIT ?)",
+                (self.max_size,)
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT key, payload, created_at FROM response_cache ORDER BY rowid"
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("加载响应缓存失败: %s", e)
+            self._conn = None
+            return 0
+        
+        # 按写入顺序回放，最近写入的条目位于LRU末端；有效期从写入时算起
+        for key, payload, created_at in rows:
+            self._put(key, json.loads(payload))
+            if self.ttl is not None:
+                self._expires[key] -= now - created_at
+        
+        return len(rows)
+    
+    def close(self) -> None:
+        """关闭持久化连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._expires.clear()
+        if self._conn is not None:
+            try:
+                self._conn.execute("DELETE FROM response_cache")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("清空响应缓存失败: %s", e)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _check_version(self) -> None:
+        """知识库版本变化时丢弃旧版本的响应 (其他进程修改知识库后同样生效)"""
+        if self.version is None:
+            return
+        current = self.version()
+        if current == self._version:
+            return
+        
+        self._version = current
+        self._entries.clear()
+        self._expires.clear()
+        if self._conn is not None:
+            try:
+                self._conn.execute("DELETE FROM response_cache WHERE version != ?", (current,))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("清理旧版本响应缓存失败: %s", e)
+    
+    def _put(self, key: str, payload: Dict[str, Any]) -> None:
+        """写入内存LRU"""
+        self._entries[key] = payload
+        self._entries.move_to_end(key)
+        if self.ttl is not None:
+            self._expires[key] = time.monotonic() + self.ttl
+        while len(self._entries) > self.max_size:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._expires.pop(evicted_key, None)
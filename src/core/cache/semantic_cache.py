@@ -0,0 +1,83 @@
+"""
+语义缓存 - 基于问题向量相似度复用相近问题的回答
+"""
+import copy
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+class SemanticCache:
+    """语义缓存 (余弦相似度 ≥ 阈值即视为同一问题)"""
+    
+    def __init__(self, max_size: int = 512, threshold: float = 0.92):
+        """
+        初始化语义缓存
+        
+        Args:
+            max_size: 最多缓存的问题数，超出后淘汰最久未使用的条目
+            threshold: 命中所需的最小余弦相似度
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None  # 首次写入时按向量维度分配
+        self._used = np.zeros(max_size, dtype=bool)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_size
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+    
+    def lookup(self, vector: List[float]) -> Optional[Dict[str, Any]]:
+        """查找最相近的已缓存问题，命中时返回响应副本"""
+        if not self._lru:
+            return None
+        
+        query = self._normalize(vector)
+        if query is None or query.shape[0] != self._vectors.shape[1]:
+            return None
+        
+        similarities = self._vectors @ query
+        similarities[~self._used] = -1.0
+        slot = int(np.argmax(similarities))
+        if similarities[slot] < self.threshold:
+            return None
+        
+        self._lru.move_to_end(slot)
+        return copy.deepcopy(self._entries[slot])
+    
+    def add(self, vector: List[float], payload: Dict[str, Any]) -> None:
+        """写入问题向量及对应响应"""
+        normalized = self._normalize(vector)
+        if normalized is None:
+            return
+        
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_size, normalized.shape[0]), dtype=np.float32)
+        elif normalized.shape[0] != self._vectors.shape[1]:
+            return
+        
+        # 优先使用空闲槽位，否则淘汰最久未使用的条目
+        if len(self._lru) < self.max_size:
+            slot = int(np.argmin(self._used))
+        else:
+            slot, _ = self._lru.popitem(last=False)
+        
+        self._vectors[slot] = normalized
+        self._used[slot] = True
+        self._entries[slot] = copy.deepcopy(payload)
+        self._lru[slot] = None
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._used[:] = False
+        self._entries = [None] * self.max_size
+        self._lru.clear()
+    
+    def __len__(self) -> int:
+        return len(self._lru)
+    
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        """L2归一化，使内积等于余弦相似度"""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        if array.ndim != 1 or norm == 0:
+            return None
+        return array / norm
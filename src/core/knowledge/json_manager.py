@@ -8,6 +8,7 @@ from pathlib import Path
 from datetime import datetime
 
 from .base import KnowledgeBase, KnowledgeItem
+from .search_index import KnowledgeSearchIndex
 from ...config.settings import settings, PROJECT_ROOT
 
 class JSONKnowledgeManager(KnowledgeBase):
@@ -16,6 +17,8 @@ class JSONKnowledgeManager(KnowledgeBase):
     def __init__(self, file_path: str = None):
         self.file_path = Path(file_path or PROJECT_ROOT / settings.knowledge_path)
         self.knowledge_items: Dict[str, KnowledgeItem] = {}
+        self.search_index = KnowledgeSearchIndex([])
+        self.full_context = ""
         self.loaded = False
     
     async def load(self) -> bool:
@@ -45,6 +48,7 @@ class JSONKnowledgeManager(KnowledgeBase):
                     )
                     self.knowledge_items[item.id] = item
             
+            self._rebuild_index()
             self.loaded = True
             return True
             
@@ -128,32 +132,13 @@ class JSONKnowledgeManager(KnowledgeBase):
         if not self.loaded:
             await self.load()
         
-        query_lower = query.lower()
         results = []
+        for item_id, score in self.search_index.search(query, category, limit):
+            item = self.knowledge_items[item_id]
+            item.metadata["search_score"] = score
+            results.append(item)
         
-        for item in self.knowledge_items.values():
-            # 分类过滤
-            if category and item.category != category:
-                continue
-            
-            # 简单关键词匹配
-            score = 0
-            if query_lower in item.title.lower():
-                score += 3
-            if query_lower in item.content.lower():
-                score += 1
-            for tag in item.tags:
-                if query_lower in tag.lower():
-                    score += 2
-            
-            if score > 0:
-                item.metadata["search_score"] = score
-                results.append(item)
-        
-        # 按分数排序
-        results.sort(key=lambda x: x.metadata.get("search_score", 0), reverse=True)
-        
-        return results[:limit]
+        return results
     
     async def get_by_id(self, item_id: str) -> Optional[KnowledgeItem]:
         """根据ID获取知识项"""
@@ -179,6 +164,7 @@ class JSONKnowledgeManager(KnowledgeBase):
             item.updated_at = item.created_at
             
             self.knowledge_items[item.id] = item
+            self._rebuild_index()
             await self._save_to_file()
             return True
             
@@ -194,6 +180,7 @@ class JSONKnowledgeManager(KnowledgeBase):
             
             item.updated_at = datetime.now().isoformat()
             self.knowledge_items[item.id] = item
+            self._rebuild_index()
             await self._save_to_file()
             return True
             
@@ -206,6 +193,7 @@ class JSONKnowledgeManager(KnowledgeBase):
         try:
             if item_id in self.knowledge_items:
                 del self.knowledge_items[item_id]
+                self._rebuild_index()
                 await self._save_to_file()
                 return True
             return False
@@ -243,6 +231,14 @@ class JSONKnowledgeManager(KnowledgeBase):
             "loaded": self.loaded
         }
     
+    def _rebuild_index(self) -> None:
+        """知识项变化后重建检索索引和全量上下文"""
+        self.search_index = KnowledgeSearchIndex(self.knowledge_items.values())
+        self.full_context = "".join(
+            f"标题: {item.title}\n内容: {item.content}\n\n"
+            for item in self.knowledge_items.values()
+        )
+    
     async def _save_to_file(self) -> None:
         """保存到文件"""
         data = {"knowledge_base": {}}
@@ -0,0 +1,104 @@
+"""
+知识库检索索引 - 加载时建立倒排索引与按条目对齐的数组，查询时避免逐条遍历
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .base import KnowledgeItem
+
+# 字段权重，与原有打分规则一致：标题3分、内容1分、每个标签2分
+TITLE_WEIGHT = 3
+CONTENT_WEIGHT = 1
+TAG_WEIGHT = 2
+
+class FieldIndex:
+    """同一字段文本的字/二元字倒排索引，先取候选再做子串校验，结果与逐条 `in` 判断一致"""
+    
+    def __init__(self, entries: Iterable[Tuple[int, str]]):
+        owners: List[int] = []
+        self.texts: List[str] = []
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        
+        for position, text in entries:
+            text = text.lower()
+            segment = len(self.texts)
+            owners.append(position)
+            self.texts.append(text)
+            for i, char in enumerate(text):
+                self.postings[char].add(segment)
+                if i + 1 < len(text):
+                    self.postings[text[i:i + 2]].add(segment)
+        
+        # 文本段 -> 所属条目在索引中的位置
+        self.owners = np.array(owners, dtype=np.intp)
+    
+    def match(self, query: str) -> np.ndarray:
+        """返回包含查询的文本段所属条目位置 (每段文本最多命中一次)"""
+        if not query:
+            return self.owners
+        if len(query) == 1:
+            segments = self.postings.get(query, ())
+        else:
+            segments = self._candidates(query)
+            segments = [s for s in segments if query in self.texts[s]]
+        return self.owners[np.fromiter(segments, dtype=np.intp, count=len(segments))]
+    
+    def _candidates(self, query: str) -> Set[int]:
+        """从最短的倒排表开始对查询的二元字求交集"""
+        grams = {query[i:i + 2] for i in range(len(query) - 1)}
+        lists = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        if not lists[0]:
+            return set()
+        candidates = set(lists[0])
+        for postings in lists[1:]:
+            candidates &= postings
+            if not candidates:
+                break
+        return candidates
+
+class KnowledgeSearchIndex:
+    """知识库关键词检索索引"""
+    
+    def __init__(self, items: Iterable[KnowledgeItem]):
+        items = list(items)
+        self.ids: List[str] = [item.id for item in items]
+        self.categories = np.array([item.category for item in items], dtype=object)
+        
+        self.titles = FieldIndex((i, item.title) for i, item in enumerate(items))
+        self.contents = FieldIndex((i, item.content) for i, item in enumerate(items))
+        self.tags = FieldIndex((i, tag) for i, item in enumerate(items) for tag in item.tags)
+    
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        """返回按分数降序排列的 (条目ID, 分数) 列表"""
+        count = len(self.ids)
+        if count == 0 or limit <= 0:
+            return []
+        
+        query_lower = query.lower()
+        scores = np.zeros(count, dtype=np.int64)
+        np.add.at(scores, self.titles.match(query_lower), TITLE_WEIGHT)
+        np.add.at(scores, self.contents.match(query_lower), CONTENT_WEIGHT)
+        np.add.at(scores, self.tags.match(query_lower), TAG_WEIGHT)
+        
+        if category:
+            scores[self.categories != category] = 0
+        
+        hits = np.flatnonzero(scores)
+        if hits.size == 0:
+            return []
+        
+        # 分数降序，同分时保持知识库中的原始顺序；只对前 limit 个排序
+        keys = -scores[hits] * count + hits
+        if hits.size > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            hits, keys = hits[top], keys[top]
+        hits = hits[np.argsort(keys)]
+        
+        return [(self.ids[i], int(scores[i])) for i in hits]
@@ -0,0 +1,66 @@
+"""
+向量化请求合批 - 把短时间内到达的多个问题合并为一次向量化调用
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+class EmbeddingBatcher:
+    """异步微批处理器：攒够 max_batch 条或等待 max_wait_ms 后统一调用一次 embed"""
+    
+    def __init__(self, embedder, max_batch: int = 16, max_wait_ms: float = 10):
+        self.embedder = embedder
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """启动后台合批任务"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """停止后台合批任务"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+    
+    async def embed(self, text: str) -> List[float]:
+        """提交单条文本，返回其向量"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    async def _run(self) -> None:
+        """后台循环：收集一批请求后统一向量化并分发结果"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                vectors = await self.embedder.embed([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
@@ -3,13 +3,24 @@
 """
 import time
 import json
+import asyncio
 from typing import List, Dict, Any, Optional
-from dashscope import Generation
+from dashscope import Generation, TextEmbedding
 from dashscope.api_entities.dashscope_response import GenerationResponse
 
 from .base import RAGEngine, Document, SearchResult, LLMProvider
+from .batcher import EmbeddingBatcher
 from ...config.settings import settings
 
+# 医疗报销助手的系统提示词 (进程内只构建一次)
+SYSTEM_PROMPT = """你是北京交通大学威海校区的医疗报销智能助手。请基于提供的政策文档，为用户提供准确、专业的医疗报销咨询服务。
+
+要求：
+1. 回答要准确、专业、友好
+2. 如果信息不完整，请说明
+3. 提供具体的操作建议
+4. 引用相关政策和规定"""
+
 class QwenLLMProvider(LLMProvider):
     """通义千问大语言模型提供者"""
     
@@ -29,7 +40,9 @@ class QwenLLMProvider(LLMProvider):
             full_prompt = self._build_prompt(prompt, context)
             
             # 调用通义千问API
-            response = Generation.call(
+            # SDK为同步调用，放到线程池中执行，避免阻塞事件循环
+            response = await asyncio.to_thread(
+                Generation.call,
                 model=self.model,
                 prompt=full_prompt,
                 max_tokens=max_tokens,
@@ -45,17 +58,9 @@ class QwenLLMProvider(LLMProvider):
             raise Exception(f"生成回答失败: {str(e)}")
     
     def _build_prompt(self, query: str, context: str) -> str:
-        """构建提示词"""
-        system_prompt = """你是北京交通大学威海校区的医疗报销智能助手。请基于提供的政策文档，为用户提供准确、专业的医疗报销咨询服务。
-
-要求：
-1. 回答要准确、专业、友好
-2. 如果信息不完整，请说明
-3. 提供具体的操作建议
-4. 引用相关政策和规定"""
-        
+        """构建提示词 (系统提示词为模块常量，只拼接上下文和问题)"""
         if context:
-            prompt = f"""{system_prompt}
+            prompt = f"""{SYSTEM_PROMPT}
 
 相关政策信息：
 {context}
@@ -64,7 +69,7 @@ class QwenLLMProvider(LLMProvider):
 
 请基于以上信息回答用户问题："""
         else:
-            prompt = f"""{system_prompt}
+            prompt = f"""{SYSTEM_PROMPT}
 
 用户问题：{query}
 
@@ -75,7 +80,8 @@ class QwenLLMProvider(LLMProvider):
     async def health_check(self) -> Dict[str, Any]:
         """健康检查"""
         try:
-            response = Generation.call(
+            response = await asyncio.to_thread(
+                Generation.call,
                 model=self.model,
                 prompt="测试",
                 max_tokens=10,
@@ -94,24 +100,55 @@ class QwenLLMProvider(LLMProvider):
                 "model": self.model
             }
 
+class QwenEmbeddingProvider:
+    """通义千问文本向量化提供者"""
+    
+    def __init__(self, api_key: str, model: str = "text-embedding-v2"):
+        self.api_key = api_key
+        self.model = model
+    
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """将文本转换为向量"""
+        try:
+            response = await asyncio.to_thread(
+                TextEmbedding.call,
+                model=self.model,
+                input=texts,
+                api_key=self.api_key
+            )
+            
+            if response.status_code == 200:
+                embeddings = sorted(response.output["embeddings"], key=lambda x: x["text_index"])
+                return [item["embedding"] for item in embeddings]
+            else:
+                raise Exception(f"API调用失败: {response.message}")
+                
+        except Exception as e:
+            raise Exception(f"文本向量化失败: {str(e)}")
+
 class QwenRAGEngine(RAGEngine):
     """通义千问RAG引擎"""
     
     def __init__(self, api_key: str, model: str = "qwen-plus"):
         self.llm_provider = QwenLLMProvider(api_key, model)
         self.documents: Dict[str, Document] = {}
-        self.embedding_model = None  # 预留向量化模型
+        self.embedding_model = QwenEmbeddingProvider(api_key, settings.embedding_model)
+        self.embedding_batcher = EmbeddingBatcher(
+            self.embedding_model,
+            max_batch=settings.embedding_batch_size,
+            max_wait_ms=settings.embedding_batch_wait_ms
+        )
     
     async def search(self, query: str, top_k: int = 5) -> SearchResult:
         """搜索相关文档"""
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             # 简单的关键词匹配搜索 (MVP版本)
             # 后续可扩展为向量搜索
             relevant_docs = self._simple_search(query, top_k)
             
-            search_time = time.time() - start_time
+            search_time = time.perf_counter() - start_time
             
             return SearchResult(
                 documents=relevant_docs,
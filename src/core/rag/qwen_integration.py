@@ -9,6 +9,17 @@ import dashscope
 from dashscope.aigc.generation import Generation
 from dashscope.api_entities.dashscope_response import GenerationResponse
 
+# RAG系统提示词 (进程内只构建一次)
+RAG_SYSTEM_PROMPT = """你是北京交通大学威海校区的医疗报销智能助手。请基于提供的政策文档，为用户提供准确、专业的医疗报销咨询服务。
+
+要求：
+1. 回答要准确、专业、友好
+2. 如果信息不完整，请说明
+3. 提供具体的操作建议
+4. 引用相关政策和规定
+5. 不要编造不存在的信息
+6. 如果提供的上下文中没有相关信息，请明确说明"""
+
 class QwenLLM:
     """通义千问大语言模型接口"""
     
@@ -77,7 +88,8 @@ class QwenLLM:
             print(f"生成回答时出错: {str(e)}")
             return f"抱歉，服务暂时不可用: {str(e)}"
     
-    def rag_generate(self, query: str, context: str, max_tokens: int = 1500) -> str:
+    def rag_generate(self, query: str, context: str, max_tokens: int = 1500,
+                     system_prompt: str = RAG_SYSTEM_PROMPT) -> str:
         """
         基于RAG的生成
         
@@ -85,20 +97,11 @@ class QwenLLM:
             query: 用户问题
             context: 上下文信息
             max_tokens: 最大生成长度
+            system_prompt: 系统提示词，默认使用预先构建的RAG系统提示词
             
         Returns:
             生成的回答
         """
-        system_prompt = """你是北京交通大学威海校区的医疗报销智能助手。请基于提供的政策文档，为用户提供准确、专业的医疗报销咨询服务。
-
-要求：
-1. 回答要准确、专业、友好
-2. 如果信息不完整，请说明
-3. 提供具体的操作建议
-4. 引用相关政策和规定
-5. 不要编造不存在的信息
-6. 如果提供的上下文中没有相关信息，请明确说明"""
-
         prompt = f"""### 相关政策信息：
 
 {context}
@@ -119,14 +122,14 @@ class QwenLLM:
             健康状态信息
         """
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             response = Generation.call(
                 model=self.model,
                 messages=[{"role": "user", "content": "你好"}],
                 result_format='message',
                 max_tokens=10
             )
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             
             return {
                 "status": "healthy" if response.status_code == 200 else "unhealthy",
@@ -5,30 +5,121 @@ import os
 import time
 import json
 import asyncio
+import logging
 from typing import List, Dict, Any, Optional, AsyncGenerator
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import dashscope
 from dashscope.aigc.generation import Generation
 from dashscope.api_entities.dashscope_response import GenerationResponse
 
+from ..cache.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# RAG系统提示词 (进程内只构建一次，每次请求只拼接检索结果和问题)
+RAG_SYSTEM_PROMPT = """你是北京交通大学威海校区的医疗报销智能助手"小医"。你的性格温柔、耐心、乐于助人，总是用亲切友好的语气与用户交流。
+
+【人设与风格】
+- 你叫"小医"，是一位温暖贴心的医疗报销顾问
+- 说话语气亲切自然，像朋友一样交流，避免过于机械或生硬
+- 对用户的问候要热情回应，不要直接跳到业务话题
+- 即使知识库中没有信息，也要委婉表达，提供其他可能的帮助方式
+
+【回答原则】
+1. 优先基于知识库内容回答问题，确保信息准确可靠
+2. 不要编造不在知识库中的信息，但可以用温和的方式表达信息缺失
+3. 当知识库没有相关信息时，可以说"目前我的知识库中没有这方面的详细信息，但我可以帮你..."
+4. 对于报销比例、金额、截止日期、联系人等具体信息，引用知识库内容但不要强调"根据知识库"
+
+【知识库内容】
+知识库包含以下分类信息：
+- 报销政策：包含报销比例、适用人群、医院范围等
+- 材料要求：包含需要提交的材料清单
+- 报销流程：包含申请步骤、办理地点、报销周期和截止日期
+- 联系人信息：包含姓名、部门、职责、办公地点等
+- 常见问题：包含具体问题和对应回答
+- 特殊情况：包含特殊场景的处理方法
+- 医院信息：包含医院地址、联系方式等
+
+【回答格式】
+1. 使用Markdown格式，重要信息加粗
+2. 回答要简洁明了，语气自然亲切
+3. 如果涉及多个知识条目，整合信息避免重复
+4. 引用政策时，可以用"按照学生门诊报销政策..."而不是强调"根据知识库..."
+
+【通用回复】
+- 对于问候类消息（如"你好"、"早上好"等），先友好回应问候，再简单介绍自己
+- 对于闲聊类消息，保持友好回应，但可以自然引导到医疗报销相关话题
+- 对于感谢，表达"不客气"、"很高兴能帮到你"等回应
+
+【回答结构建议】
+1. 亲切的称呼或回应（如"同学你好"、"很高兴回答你的问题"）
+2. 针对问题的直接解答
+3. 必要的补充说明或温馨提示
+4. 结束语（如"希望对你有帮助"、"还有其他问题随时问我"）"""
+
+# RAG用户提示词中问题之后的固定回答要求
+RAG_ANSWER_REQUIREMENTS = """
+
+请严格按照以下要求回答用户问题：
+1. 只使用上述知识库中提供的信息
+2. 不要编造任何不在知识库中的信息
+3. 如果知识库中没有相关信息，直接告知用户
+4. 不要生成任何占位符文本
+5. 使用Markdown格式，重要信息加粗
+
+你的回答应该简洁明了，直接解答用户问题。如果知识库中有多个相关条目，请整合信息避免重复。"""
+
+def create_http_session(pool_size: int = 20) -> requests.Session:
+    """创建调用DashScope用的HTTP会话 - 连接池复用TCP/TLS连接，只在请求确定未被处理时退避重试
+
+    生成接口按调用计费，请求一旦送达服务端就可能已经完成生成，因此读超时和5xx都不重试；
+    只重试连接失败 (请求未发出) 和 429限流 (请求被拒绝，未执行)。
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        other=0,
+        backoff_factor=0.2,
+        status_forcelist=[429],
+        allowed_methods=None  # DashScope接口均为POST，默认不在重试范围内
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
 class QwenStreamLLM:
     """通义千问大语言模型接口 - 支持流式输出"""
     
-    def __init__(self, api_key: str = None, model: str = "qwen-plus"):
+    def __init__(self, api_key: str = None, model: str = "qwen-plus", cache_size: int = 2048):
         """
         初始化通义千问接口
         
         Args:
             api_key: 通义千问API密钥，如果为None则从环境变量获取
             model: 模型名称，默认为qwen-plus
+            cache_size: 流式回答缓存的最大条目数
         """
         self.api_key = api_key or os.environ.get("DASHSCOPE_API_KEY")
         if not self.api_key:
             raise ValueError("未设置API密钥，请通过参数传入或设置环境变量DASHSCOPE_API_KEY")
         
         self.model = model
+        # 相同提示词 (问题+检索到的上下文) 的回答缓存，避免重复调用API
+        self.answer_cache = ResponseCache(max_size=cache_size)
+        # 进程内共享的HTTP会话，所有API调用复用连接，避免每次请求重新握手
+        self.session = create_http_session()
         # 设置DashScope API密钥
         dashscope.api_key = self.api_key
     
+    def close(self):
+        """关闭HTTP会话，释放连接池中的连接"""
+        self.session.close()
+    
     def generate(self, prompt: str, system_prompt: str = None, max_tokens: int = 1500) -> str:
         """
         生成文本
@@ -65,17 +156,18 @@ class QwenStreamLLM:
                 max_tokens=max_tokens,
                 temperature=0.7,
                 top_p=0.8,
+                session=self.session,
             )
             
             if response.status_code == 200:
                 return response.output.choices[0].message.content
             else:
                 error_msg = f"API调用失败: {response.code} - {response.message}"
-                print(f"错误: {error_msg}")
+                logger.error("错误: %s", error_msg)
                 return f"抱歉，我遇到了技术问题: {error_msg}"
                 
         except Exception as e:
-            print(f"生成回答时出错: {str(e)}")
+            logger.error("生成回答时出错: %s", e)
             return f"抱歉，服务暂时不可用: {str(e)}"
     
     async def generate_stream(self, prompt: str, system_prompt: str = None, max_tokens: int = 1500) -> AsyncGenerator[str, None]:
@@ -106,39 +198,64 @@ class QwenStreamLLM:
                 "content": prompt
             })
             
-            # 调用通义千问API - 流式模式
-            # 注意：这里我们使用模拟流式输出，因为当前版本可能不支持流式API
-            # 在实际实现中，应该使用通义千问的流式API
+            # 相同提示词直接使用缓存的完整回答
+            cache_key = f"{system_prompt}\x00{prompt}\x00{max_tokens}"
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                yield cached["text"]
+                return
             
-            # 先获取完整回答
-            response = Generation.call(
+            # 调用通义千问API - 流式模式，每次返回增量文本
+            # SDK为同步迭代器，创建和取下一段都放到线程池中执行，避免阻塞事件循环
+            responses = await asyncio.to_thread(
+                Generation.call,
                 model=self.model,
                 messages=messages,
                 result_format='message',
                 max_tokens=max_tokens,
                 temperature=0.7,
                 top_p=0.8,
+                stream=True,
+                incremental_output=True,
+                session=self.session,
             )
             
-            if response.status_code == 200:
-                full_text = response.output.choices[0].message.content
+            parts = []
+            while True:
+                response = await asyncio.to_thread(next, responses, None)
+                if response is None:
+                    break
+                
+                if response.status_code != 200:
+                    error_msg = f"API调用失败: {response.code} - {response.message}"
+                    logger.error("错误: %s", error_msg)
+                    yield f"抱歉，我遇到了技术问题: {error_msg}"
+                    return
                 
-                # 模拟流式输出
-                chunk_size = 10  # 每次输出10个字符
-                for i in range(0, len(full_text), chunk_size):
-                    chunk = full_text[i:i+chunk_size]
+                chunk = response.output.choices[0].message.content
+                if chunk:
+                    parts.append(chunk)
                     yield chunk
-                    await asyncio.sleep(0.1)  # 添加延迟，模拟流式效果
-            else:
-                error_msg = f"API调用失败: {response.code} - {response.message}"
-                print(f"错误: {error_msg}")
-                yield f"抱歉，我遇到了技术问题: {error_msg}"
+            
+            if parts:
+                self.answer_cache.set(cache_key, {"text": "".join(parts)})
                 
         except Exception as e:
-            print(f"生成回答时出错: {str(e)}")
+            logger.error("生成回答时出错: %s", e)
             yield f"抱歉，服务暂时不可用: {str(e)}"
     
-    def rag_generate(self, query: str, context: str, max_tokens: int = 1500) -> str:
+    def _build_rag_prompt(self, query: str, context: str) -> str:
+        """构建RAG用户提示词 (只拼接检索结果和问题两部分可变内容)"""
+        return f"""### 知识库检索结果：
+
+{context}
+
+### 用户问题：
+
+{query}{RAG_ANSWER_REQUIREMENTS}"""
+    
+    def rag_generate(self, query: str, context: str, max_tokens: int = 1500,
+                     system_prompt: str = RAG_SYSTEM_PROMPT) -> str:
         """
         基于RAG的生成
         
@@ -146,71 +263,16 @@ class QwenStreamLLM:
             query: 用户问题
             context: 上下文信息
             max_tokens: 最大生成长度
+            system_prompt: 系统提示词，默认使用预先构建的RAG系统提示词
             
         Returns:
             生成的回答
         """
-        system_prompt = """你是北京交通大学威海校区的医疗报销智能助手"小医"。你的性格温柔、耐心、乐于助人，总是用亲切友好的语气与用户交流。
-
-【人设与风格】
-- 你叫"小医"，是一位温暖贴心的医疗报销顾问
-- 说话语气亲切自然，像朋友一样交流，避免过于机械或生硬
-- 对用户的问候要热情回应，不要直接跳到业务话题
-- 即使知识库中没有信息，也要委婉表达，提供其他可能的帮助方式
-
-【回答原则】
-1. 优先基于知识库内容回答问题，确保信息准确可靠
-2. 不要编造不在知识库中的信息，但可以用温和的方式表达信息缺失
-3. 当知识库没有相关信息时，可以说"目前我的知识库中没有这方面的详细信息，但我可以帮你..."
-4. 对于报销比例、金额、截止日期、联系人等具体信息，引用知识库内容但不要强调"根据知识库"
-
-【知识库内容】
-知识库包含以下分类信息：
-- 报销政策：包含报销比例、适用人群、医院范围等
-- 材料要求：包含需要提交的材料清单
-- 报销流程：包含申请步骤、办理地点、报销周期和截止日期
-- 联系人信息：包含姓名、部门、职责、办公地点等
-- 常见问题：包含具体问题和对应回答
-- 特殊情况：包含特殊场景的处理方法
-- 医院信息：包含医院地址、联系方式等
-
-【回答格式】
-1. 使用Markdown格式，重要信息加粗
-2. 回答要简洁明了，语气自然亲切
-3. 如果涉及多个知识条目，整合信息避免重复
-4. 引用政策时，可以用"按照学生门诊报销政策..."而不是强调"根据知识库..."
-
-【通用回复】
-- 对于问候类消息（如"你好"、"早上好"等），先友好回应问候，再简单介绍自己
-- 对于闲聊类消息，保持友好回应，但可以自然引导到医疗报销相关话题
-- 对于感谢，表达"不客气"、"很高兴能帮到你"等回应
-
-【回答结构建议】
-1. 亲切的称呼或回应（如"同学你好"、"很高兴回答你的问题"）
-2. 针对问题的直接解答
-3. 必要的补充说明或温馨提示
-4. 结束语（如"希望对你有帮助"、"还有其他问题随时问我"）"""
-
-        prompt = f"""### 知识库检索结果：
-
-{context}
-
-### 用户问题：
-
-{query}
-
-请严格按照以下要求回答用户问题：
-1. 只使用上述知识库中提供的信息
-2. 不要编造任何不在知识库中的信息
-3. 如果知识库中没有相关信息，直接告知用户
-4. 不要生成任何占位符文本
-5. 使用Markdown格式，重要信息加粗
-
-你的回答应该简洁明了，直接解答用户问题。如果知识库中有多个相关条目，请整合信息避免重复。"""
-
+        prompt = self._build_rag_prompt(query, context)
         return self.generate(prompt, system_prompt, max_tokens)
     
-    async def rag_generate_stream(self, query: str, context: str, max_tokens: int = 1500) -> AsyncGenerator[str, None]:
+    async def rag_generate_stream(self, query: str, context: str, max_tokens: int = 1500,
+                                  system_prompt: str = RAG_SYSTEM_PROMPT) -> AsyncGenerator[str, None]:
         """
         基于RAG的流式生成
         
@@ -218,68 +280,12 @@ class QwenStreamLLM:
             query: 用户问题
             context: 上下文信息
             max_tokens: 最大生成长度
+            system_prompt: 系统提示词，默认使用预先构建的RAG系统提示词
             
         Yields:
             生成的文本片段
         """
-        system_prompt = """你是北京交通大学威海校区的医疗报销智能助手"小医"。你的性格温柔、耐心、乐于助人，总是用亲切友好的语气与用户交流。
-
-【人设与风格】
-- 你叫"小医"，是一位温暖贴心的医疗报销顾问
-- 说话语气亲切自然，像朋友一样交流，避免过于机械或生硬
-- 对用户的问候要热情回应，不要直接跳到业务话题
-- 即使知识库中没有信息，也要委婉表达，提供其他可能的帮助方式
-
-【回答原则】
-1. 优先基于知识库内容回答问题，确保信息准确可靠
-2. 不要编造不在知识库中的信息，但可以用温和的方式表达信息缺失
-3. 当知识库没有相关信息时，可以说"目前我的知识库中没有这方面的详细信息，但我可以帮你..."
-4. 对于报销比例、金额、截止日期、联系人等具体信息，引用知识库内容但不要强调"根据知识库"
-
-【知识库内容】
-知识库包含以下分类信息：
-- 报销政策：包含报销比例、适用人群、医院范围等
-- 材料要求：包含需要提交的材料清单
-- 报销流程：包含申请步骤、办理地点、报销周期和截止日期
-- 联系人信息：包含姓名、部门、职责、办公地点等
-- 常见问题：包含具体问题和对应回答
-- 特殊情况：包含特殊场景的处理方法
-- 医院信息：包含医院地址、联系方式等
-
-【回答格式】
-1. 使用Markdown格式，重要信息加粗
-2. 回答要简洁明了，语气自然亲切
-3. 如果涉及多个知识条目，整合信息避免重复
-4. 引用政策时，可以用"按照学生门诊报销政策..."而不是强调"根据知识库..."
-
-【通用回复】
-- 对于问候类消息（如"你好"、"早上好"等），先友好回应问候，再简单介绍自己
-- 对于闲聊类消息，保持友好回应，但可以自然引导到医疗报销相关话题
-- 对于感谢，表达"不客气"、"很高兴能帮到你"等回应
-
-【回答结构建议】
-1. 亲切的称呼或回应（如"同学你好"、"很高兴回答你的问题"）
-2. 针对问题的直接解答
-3. 必要的补充说明或温馨提示
-4. 结束语（如"希望对你有帮助"、"还有其他问题随时问我"）"""
-
-        prompt = f"""### 知识库检索结果：
-
-{context}
-
-### 用户问题：
-
-{query}
-
-请严格按照以下要求回答用户问题：
-1. 只使用上述知识库中提供的信息
-2. 不要编造任何不在知识库中的信息
-3. 如果知识库中没有相关信息，直接告知用户
-4. 不要生成任何占位符文本
-5. 使用Markdown格式，重要信息加粗
-
-你的回答应该简洁明了，直接解答用户问题。如果知识库中有多个相关条目，请整合信息避免重复。"""
-
+        prompt = self._build_rag_prompt(query, context)
         async for chunk in self.generate_stream(prompt, system_prompt, max_tokens):
             yield chunk
     
@@ -291,14 +297,15 @@ class QwenStreamLLM:
             健康状态信息
         """
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             response = Generation.call(
                 model=self.model,
                 messages=[{"role": "user", "content": "你好"}],
                 result_format='message',
-                max_tokens=10
+                max_tokens=10,
+                session=self.session
             )
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             
             return {
                 "status": "healthy" if response.status_code == 200 else "unhealthy",
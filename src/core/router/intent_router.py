@@ -4,10 +4,14 @@
 """
 import re
 import json
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union, Pattern
 from dataclasses import dataclass
 from enum import Enum
 
+# 查询预处理用的正则 (模块加载时编译一次)
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+WHITESPACE_RE = re.compile(r'\s+')
+
 class SkillType(Enum):
     """技能类型枚举"""
     PROCESS = "process"      # 办事流程
@@ -34,6 +38,21 @@ class IntentRouter:
         self.skill_patterns = self._init_skill_patterns()
         self.entity_patterns = self._init_entity_patterns()
         self.stop_words = self._init_stop_words()
+        # 匹配用的模式 (普通词语直接做子串匹配，含正则语法的预编译)
+        self._skill_matchers = {
+            skill: self._compile_patterns(patterns)
+            for skill, patterns in self.skill_patterns.items()
+        }
+        self._entity_matchers = {
+            entity_type: [re.compile(pattern) for pattern in patterns]
+            for entity_type, patterns in self.entity_patterns.items()
+        }
+    
+    @staticmethod
+    def _compile_patterns(patterns: List[str]) -> List[Union[str, Pattern]]:
+        """普通词语保留为字符串，含正则语法的模式编译为正则对象"""
+        return [pattern if re.escape(pattern) == pattern else re.compile(pattern)
+                for pattern in patterns]
     
     def _init_skill_patterns(self) -> Dict[SkillType, List[str]]:
         """初始化技能匹配模式"""
@@ -156,7 +175,7 @@ class IntentRouter:
         
         # 计算各技能的匹配分数
         skill_scores = {}
-        for skill, patterns in self.skill_patterns.items():
+        for skill, patterns in self._skill_matchers.items():
             score = self._calculate_skill_score(processed_query, patterns)
             skill_scores[skill] = score
         
@@ -190,26 +209,31 @@ class IntentRouter:
         query = query.lower()
         
         # 移除标点符号
-        query = re.sub(r'[^\w\s]', ' ', query)
+        query = PUNCTUATION_RE.sub(' ', query)
         
         # 移除多余空格
-        query = re.sub(r'\s+', ' ', query).strip()
+        query = WHITESPACE_RE.sub(' ', query).strip()
         
         return query
     
-    def _calculate_skill_score(self, query: str, patterns: List[str]) -> float:
+    def _calculate_skill_score(self, query: str, patterns: List[Union[str, Pattern]]) -> float:
         """计算技能匹配分数"""
         total_score = 0.0
         matched_patterns = 0
         
         for pattern in patterns:
-            if re.search(pattern, query):
-                # 完全匹配给高分
-                if re.fullmatch(pattern, query):
-                    total_score += 2.0
-                else:
-                    total_score += 1.0
-                matched_patterns += 1
+            if isinstance(pattern, str):
+                if pattern not in query:
+                    continue
+                full_match = pattern == query
+            else:
+                if not pattern.search(query):
+                    continue
+                full_match = pattern.fullmatch(query) is not None
+            
+            # 完全匹配给高分
+            total_score += 2.0 if full_match else 1.0
+            matched_patterns += 1
         
         # 归一化分数
         if matched_patterns == 0:
@@ -225,9 +249,9 @@ class IntentRouter:
         """提取实体信息"""
         entities = {}
         
-        for entity_type, patterns in self.entity_patterns.items():
+        for entity_type, patterns in self._entity_matchers.items():
             for pattern in patterns:
-                match = re.search(pattern, query)
+                match = pattern.search(query)
                 if match:
                     entities[entity_type] = match.group()
                     break
@@ -3,10 +3,12 @@
 基础技能类 - 所有Agent Skills的基类
 """
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, AsyncGenerator
+from typing import Callable, Dict, List, Any, Optional, AsyncGenerator, NamedTuple, Tuple, Union
 from dataclasses import dataclass
 import json
+import heapq
 import yaml
+from operator import itemgetter
 from pathlib import Path
 
 @dataclass
@@ -18,6 +20,16 @@ class SkillResult:
     confidence: float
     metadata: Dict[str, Any]
 
+class LoweredItem(NamedTuple):
+    """知识条目各匹配字段的小写形式"""
+    title: str
+    content: str
+    question: str
+    tags: Tuple[str, ...]
+    keywords: Tuple[str, ...]
+    name: str
+    dept: str
+
 class BaseSkill(ABC):
     """基础技能类 - 定义所有Skills的通用接口"""
     
@@ -25,6 +37,12 @@ class BaseSkill(ABC):
         self.skill_name = skill_name
         self.knowledge_path = knowledge_path
         self.knowledge_base = {}
+        # 各分类的小写字段缓存 (首次检索时计算，知识变化时失效)
+        self._lowered: Dict[str, Union[List[LoweredItem], str]] = {}
+        # 知识条目总数缓存 (健康检查频繁读取，知识变化时失效)
+        self._total_items: Optional[int] = None
+        # 知识变化时的回调 (由使用方设置，用于清理基于旧知识的缓存)
+        self.on_knowledge_changed: Optional[Callable[[], None]] = None
         self._load_knowledge()
     
     def _load_knowledge(self):
@@ -60,6 +78,9 @@ class BaseSkill(ABC):
         except Exception as e:
             print(f"❌ 加载知识库失败: {e}")
             self.knowledge_base = {}
+        
+        self._lowered = {}
+        self._total_items = None
     
     @abstractmethod
     async def process_query(self, query: str, entities: Dict[str, Any], 
@@ -73,7 +94,8 @@ class BaseSkill(ABC):
         if not self.knowledge_base:
             return []
         
-        results = []
+        # 打分时只记录 (分数, 分类, 条目, Markdown结果)，最终只为前N个结果构建字典
+        scored = []
         query_lower = query.lower()
         
         # 确定搜索范围
@@ -88,29 +110,30 @@ class BaseSkill(ABC):
             # 处理不同类型的数据
             if isinstance(category_data, list):
                 # YAML列表数据
-                for item in category_data:
-                    score = self._calculate_relevance_score(item, query_lower)
+                lowered_items = self._get_lowered(category)
+                for item, lowered in zip(category_data, lowered_items):
+                    score = self._calculate_relevance_score(item, query_lower, lowered)
                     if score > 0:
-                        item_copy = item.copy()
-                        item_copy['score'] = score
-                        item_copy['category'] = category
-                        results.append(item_copy)
+                        scored.append((score, category, item, None))
             
             elif isinstance(category_data, dict) and category_data.get('type') == 'markdown':
                 # Markdown文档
                 content = category_data.get('content', '')
-                if self._text_contains_keywords(content, query_lower):
-                    results.append({
+                if self._text_contains_keywords(content, query_lower, self._get_lowered(category)):
+                    scored.append((0.8, category, None, {
                         'title': category,
                         'content': content[:500] + '...' if len(content) > 500 else content,
                         'category': category,
                         'score': 0.8,
                         'type': 'markdown'
-                    })
+                    }))
         
-        # 按分数排序并返回前N个结果
-        results.sort(key=lambda x: x.get('score', 0), reverse=True)
-        return results[:limit]
+        # 按分数取前N个结果 (同分保持原有顺序)
+        top = heapq.nlargest(limit, scored, key=itemgetter(0))
+        return [
+            markdown_result if item is None else {**item, 'score': score, 'category': category}
+            for score, category, item, markdown_result in top
+        ]
     
     def _get_search_categories(self, filters: List[str] = None) -> List[str]:
         """根据过滤器确定搜索分类"""
@@ -139,48 +162,75 @@ class BaseSkill(ABC):
         
         return list(categories)
     
-    def _calculate_relevance_score(self, item: Dict[str, Any], query: str) -> float:
+    def _get_lowered(self, category: str) -> Union[List[LoweredItem], str]:
+        """获取分类的小写字段缓存，不存在或已过期时重新计算"""
+        category_data = self.knowledge_base[category]
+        lowered = self._lowered.get(category)
+        
+        if isinstance(category_data, list):
+            if lowered is None or len(lowered) != len(category_data):
+                lowered = [self._lower_item(item) for item in category_data]
+                self._lowered[category] = lowered
+        elif lowered is None:
+            lowered = category_data.get('content', '').lower()
+            self._lowered[category] = lowered
+        
+        return lowered
+    
+    @staticmethod
+    def _lower_item(item: Dict[str, Any]) -> LoweredItem:
+        """计算知识条目各匹配字段的小写形式"""
+        return LoweredItem(
+            title=item.get('title', '').lower(),
+            content=item.get('content', '').lower(),
+            question=item.get('question', '').lower(),
+            tags=tuple(tag.lower() for tag in item.get('tags', [])),
+            keywords=tuple(keyword.lower() for keyword in item.get('keywords', [])),
+            name=(item.get('name') or '').lower(),
+            dept=(item.get('dept') or '').lower()
+        )
+    
+    def _calculate_relevance_score(self, item: Dict[str, Any], query: str,
+                                   lowered: LoweredItem = None) -> float:
         """计算相关性分数"""
         score = 0.0
         query_lower = query.lower()
+        if lowered is None:
+            lowered = self._lower_item(item)
         
         # 提取查询关键词
         query_words = [word for word in query_lower.split() if len(word) > 1]
         
         # 标题匹配
-        title = item.get('title', '').lower()
+        title = lowered.title
         if query_lower in title:
             score += 2.0
         elif any(word in title for word in query_words):
             score += 1.0
         
         # 内容匹配
-        content = item.get('content', '').lower()
+        content = lowered.content
         if query_lower in content:
             score += 1.5
         elif any(word in content for word in query_words):
             score += 0.5
         
         # 问题匹配（FAQ类型）
-        question = item.get('question', '').lower()
+        question = lowered.question
         if question and query_lower in question:
             score += 2.5
         elif question and any(word in question for word in query_words):
             score += 1.0
         
         # 标签匹配
-        tags = item.get('tags', [])
-        for tag in tags:
-            tag_lower = tag.lower()
+        for tag_lower in lowered.tags:
             if query_lower in tag_lower:
                 score += 1.0
             elif any(word in tag_lower for word in query_words):
                 score += 0.5
         
         # 关键词匹配
-        keywords = item.get('keywords', [])
-        for keyword in keywords:
-            keyword_lower = keyword.lower()
+        for keyword_lower in lowered.keywords:
             if query_lower in keyword_lower:
                 score += 0.8
             elif any(word in keyword_lower for word in query_words):
@@ -207,13 +257,11 @@ class BaseSkill(ABC):
                 score += 1.0
         
         # 特殊匹配逻辑 - 姓名匹配
-        name = item.get('name', '')
-        if name and name.lower() in query_lower:
+        if lowered.name and lowered.name in query_lower:
             score += 2.0
         
         # 特殊匹配逻辑 - 部门匹配
-        dept = item.get('dept', '')
-        if dept and dept.lower() in query_lower:
+        if lowered.dept and lowered.dept in query_lower:
             score += 1.5
         
         # 特殊匹配逻辑 - 学习指导相关
@@ -233,9 +281,10 @@ class BaseSkill(ABC):
         
         return score
     
-    def _text_contains_keywords(self, text: str, query: str) -> bool:
+    def _text_contains_keywords(self, text: str, query: str, text_lower: str = None) -> bool:
         """检查文本是否包含查询关键词"""
-        text_lower = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
         query_words = query.split()
         
         # 完全匹配
@@ -247,13 +296,16 @@ class BaseSkill(ABC):
     
     def get_skill_info(self) -> Dict[str, Any]:
         """获取技能信息"""
+        if self._total_items is None:
+            self._total_items = sum(
+                len(data) if isinstance(data, list) else 1 
+                for data in self.knowledge_base.values()
+            )
+        
         return {
             "name": self.skill_name,
             "knowledge_categories": list(self.knowledge_base.keys()),
-            "total_items": sum(
-                len(data) if isinstance(data, list) else 1 
-                for data in self.knowledge_base.values()
-            ),
+            "total_items": self._total_items,
             "status": "active" if self.knowledge_base else "inactive"
         }
     
@@ -266,6 +318,14 @@ class BaseSkill(ABC):
             self.knowledge_base[category].append(data)
         else:
             self.knowledge_base[category] = data
+        self._knowledge_changed(category)
+    
+    def _knowledge_changed(self, category: str):
+        """知识变化后清理该分类的检索缓存并通知使用方"""
+        self._lowered.pop(category, None)
+        self._total_items = None
+        if self.on_knowledge_changed is not None:
+            self.on_knowledge_changed()
     
     def remove_knowledge(self, category: str, item_id: str = None):
         """移除知识"""
@@ -281,5 +341,6 @@ class BaseSkill(ABC):
         else:
             # 移除整个分类
             del self.knowledge_base[category]
+        self._knowledge_changed(category)
         
         return True
@@ -0,0 +1,42 @@
+"""
+HyperLogLog基数估计 - 用固定内存统计独立访客数
+"""
+import math
+import hashlib
+
+class HyperLogLog:
+    """HyperLogLog基数估计器
+
+    精度参数 p 决定寄存器数量 m = 2^p，p=12 时占用4KB，标准误差约 1.04/√m ≈ 1.6%。
+    与保存全部IP的集合不同，内存占用不随访客数增长。
+    """
+
+    def __init__(self, p: int = 12):
+        if not 4 <= p <= 16:
+            raise ValueError("精度参数p需在4到16之间")
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self._rank_bits = 64 - p
+        self._rank_mask = (1 << self._rank_bits) - 1
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value: str):
+        """加入一个元素"""
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> self._rank_bits
+        rank = self._rank_bits - (hashed & self._rank_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def __len__(self) -> int:
+        """估计已加入的不同元素数量"""
+        estimate = self._alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+
+        # 小基数时使用线性计数修正
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+
+        return int(round(estimate))
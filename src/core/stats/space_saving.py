@@ -0,0 +1,39 @@
+"""
+Space-Saving高频项统计 - 用固定数量的计数槽统计出现最多的元素
+"""
+import heapq
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+class SpaceSaving:
+    """Space-Saving top-K 估计器
+
+    最多保留 k 个计数槽。槽位已满时，新元素顶替计数最小的槽位并继承其计数加一，
+    因此计数可能偏高，但真实出现次数超过 N/k 的元素一定会被保留。
+    不同元素数不超过 k 时结果与精确计数一致。
+    """
+
+    def __init__(self, k: int = 64):
+        if k < 1:
+            raise ValueError("计数槽数量k需大于0")
+        self.k = k
+        self.counts: Dict[str, int] = {}
+
+    def add(self, item: str):
+        """记录一次出现"""
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+        elif len(counts) < self.k:
+            counts[item] = 1
+        else:
+            victim = min(counts, key=counts.__getitem__)
+            counts[item] = counts.pop(victim) + 1
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """按计数从高到低返回前n个元素 (同计数保持加入顺序)"""
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def __len__(self) -> int:
+        """当前占用的计数槽数量"""
+        return len(self.counts)
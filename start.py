@@ -5,6 +5,10 @@
 import os
 import sys
 from pathlib import Path
+from importlib.metadata import distributions
+
+# 启动前需要确认已安装的核心依赖 (按发行包名称检查)
+REQUIRED_PACKAGES = ["fastapi", "uvicorn", "dashscope"]
 
 def check_requirements():
     """检查依赖和配置"""
@@ -22,16 +26,14 @@ def check_requirements():
         print("export DASHSCOPE_API_KEY=your_api_key_here")
         return False
     
-    # 检查依赖
-    try:
-        import fastapi
-        import uvicorn
-        import dashscope
-        print("✅ 核心依赖检查通过")
-    except ImportError as e:
-        print(f"❌ 缺少依赖: {e}")
+    # 检查依赖 (只读取已安装包的元数据，不实际导入模块)
+    installed = {(dist.metadata["Name"] or "").lower() for dist in distributions()}
+    missing = [package for package in REQUIRED_PACKAGES if package not in installed]
+    if missing:
+        print(f"❌ 缺少依赖: {', '.join(missing)}")
         print("请运行: pip install -r requirements.txt")
         return False
+    print("✅ 核心依赖检查通过")
     
     return True
 
@@ -78,6 +80,11 @@ def main():
             host=settings.host,
             port=settings.port,
             reload=settings.debug,
+            workers=1 if settings.debug else settings.workers,
+            # auto: 已安装 uvloop/httptools 时自动使用，未安装的平台 (如Windows) 回退到标准实现
+            loop="auto",
+            http="auto",
+            access_log=settings.debug,
             log_level=settings.log_level.lower()
         )
     except KeyboardInterrupt:
@@ -0,0 +1,100 @@
+"""
+API路由测试 (模拟大模型调用，使用临时JSON知识库)
+"""
+import os
+import json
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "test-key")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.api import router as api_router
+from src.core.knowledge.json_manager import JSONKnowledgeManager
+
+class FakeLLMProvider:
+    """把上下文原样作为回答返回，便于断言回答基于哪一版知识"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt, context="", max_tokens=1000):
+        self.calls += 1
+        if "出错" in prompt:
+            raise RuntimeError("模型调用超时")
+        return f"回答: {context}"
+
+class FakeRAGEngine:
+    def __init__(self):
+        self.llm_provider = FakeLLMProvider()
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    knowledge_path = tmp_path / "knowledge_base.json"
+    knowledge_path.write_text(json.dumps({"knowledge_base": {}}), encoding="utf-8")
+    manager = JSONKnowledgeManager(str(knowledge_path))
+    engine = FakeRAGEngine()
+
+    monkeypatch.setattr(api_router.settings, "semantic_cache_enabled", False)
+    api_router.response_cache.clear()
+    api_router.semantic_cache.clear()
+
+    app = FastAPI()
+    app.include_router(api_router.router)
+    app.dependency_overrides[api_router.get_rag_engine] = lambda: engine
+    app.dependency_overrides[api_router.get_knowledge_manager] = lambda: manager
+
+    test_client = TestClient(app)
+    test_client.engine = engine
+    yield test_client
+    api_router.response_cache.clear()
+
+def test_knowledge_update_invalidates_cached_answer(client):
+    """知识条目修改、删除后，相同问题不再返回缓存中的旧回答"""
+    response = client.post("/api/v1/knowledge", json={
+        "category": "policy", "title": "门诊报销比例", "content": "门诊报销比例为80%"
+    })
+    assert response.status_code == 200
+    item_id = response.json()["id"]
+
+    question = {"question": "门诊报销比例是多少？"}
+    first = client.post("/api/v1/ask", json=question).json()["answer"]
+    assert "80%" in first
+    assert client.post("/api/v1/ask", json=question).json()["answer"] == first
+    assert client.engine.llm_provider.calls == 1
+
+    response = client.put(f"/api/v1/knowledge/{item_id}", json={"content": "门诊报销比例为90%"})
+    assert response.status_code == 200
+    second = client.post("/api/v1/ask", json=question).json()["answer"]
+    assert "90%" in second and "80%" not in second
+
+    assert client.delete(f"/api/v1/knowledge/{item_id}").status_code == 200
+    third = client.post("/api/v1/ask", json=question).json()["answer"]
+    assert "90%" not in third
+    assert client.engine.llm_provider.calls == 3
+
+def test_ask_batch_keeps_answers_when_one_question_fails(client):
+    """批量问答中某个问题失败时，其余问题的回答照常返回"""
+    client.post("/api/v1/knowledge", json={
+        "category": "policy", "title": "住院报销比例", "content": "住院报销比例为95%"
+    })
+
+    response = client.post("/api/v1/ask_batch", json={
+        "questions": ["住院报销比例是多少？", "这个问题会出错", "住院报销比例？"]
+    })
+    assert response.status_code == 200
+
+    answers = response.json()["answers"]
+    assert len(answers) == 3
+    assert "95%" in answers[0]["answer"] and answers[0]["error"] is None
+    assert "模型调用超时" in answers[1]["error"]
+    assert "95%" in answers[2]["answer"] and answers[2]["error"] is None
+
+def test_quick_questions_read_from_template():
+    """预热使用的快捷问题与Web界面模板中的按钮一致"""
+    questions = api_router.load_quick_questions()
+    template = api_router.WEB_TEMPLATE_PATH.read_text(encoding="utf-8")
+    assert questions
+    assert len(questions) == template.count('class="quick-button"')
+    assert "感冒药能报销吗？" in questions
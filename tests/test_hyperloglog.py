@@ -0,0 +1,21 @@
+"""
+HyperLogLog基数估计测试
+"""
+from src.core.stats.hyperloglog import HyperLogLog
+
+def test_small_cardinality_exact():
+    """少量元素时估计值与实际一致，重复元素不重复计数"""
+    hll = HyperLogLog()
+    assert len(hll) == 0
+    for _ in range(3):
+        for i in range(20):
+            hll.add(f"192.168.0.{i}")
+    assert len(hll) == 20
+
+def test_large_cardinality_within_error():
+    """大量元素时误差在5%以内"""
+    hll = HyperLogLog()
+    count = 50000
+    for i in range(count):
+        hll.add(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}")
+    assert abs(len(hll) - count) / count < 0.05
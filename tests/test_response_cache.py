@@ -0,0 +1,59 @@
+"""
+问答响应缓存SQLite持久化测试
+"""
+import sqlite3
+
+from src.core.cache.response_cache import ResponseCache
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+def test_knowledge_version_change_drops_persisted_answers(tmp_path):
+    """知识库版本变化后，重启加载和运行中 (其他进程修改知识库) 都不再返回旧回答"""
+    db_path = str(tmp_path / "cache.db")
+    version = ["v1"]
+    cache = ResponseCache(db_path=db_path, version=lambda: version[0])
+    cache.load()
+    cache.set("门诊报销比例？", {"answer": "80%"})
+    cache.close()
+
+    restarted = ResponseCache(db_path=db_path, version=lambda: version[0])
+    assert restarted.load() == 1
+    assert restarted.get("门诊报销比例？") == {"answer": "80%"}
+
+    version[0] = "v2"
+    assert restarted.get("门诊报销比例？") is None
+    assert count_rows(db_path) == 0
+    restarted.close()
+
+def test_persisted_answers_expire(tmp_path):
+    """持久化条目超过有效期后加载时删除"""
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path=db_path, ttl=60)
+    cache.load()
+    cache.set("住院报销比例？", {"answer": "85%"})
+    cache._conn.execute("UPDATE response_cache SET created_at = created_at - 120")
+    cache._conn.commit()
+    cache.close()
+
+    restarted = ResponseCache(db_path=db_path, ttl=60)
+    assert restarted.load() == 0
+    assert count_rows(db_path) == 0
+    restarted.close()
+
+def test_persisted_rows_bounded_by_max_size(tmp_path):
+    """写入时删除超出容量的最早条目"""
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_size=3, db_path=db_path)
+    cache.load()
+    for i in range(10):
+        cache.set(f"问题{i}", {"answer": str(i)})
+    cache.set("问题7", {"answer": "7"})
+    cache.close()
+
+    assert count_rows(db_path) == 3
+    restarted = ResponseCache(max_size=3, db_path=db_path)
+    assert restarted.load() == 3
+    assert [restarted.get(f"问题{i}") is not None for i in (6, 7, 8, 9)] == [False, True, True, True]
+    restarted.close()
@@ -0,0 +1,47 @@
+"""
+知识库检索索引测试
+"""
+from src.core.knowledge.base import KnowledgeItem
+from src.core.knowledge.search_index import KnowledgeSearchIndex
+
+ITEMS = [
+    KnowledgeItem(id="policy_001", category="policy", title="门诊报销政策",
+                  content="学生门诊医疗费用报销比例为80%。", tags=["门诊", "报销", "比例"]),
+    KnowledgeItem(id="policy_002", category="policy", title="住院报销政策",
+                  content="住院医疗费用报销比例为85%，需要提供住院证明。", tags=["住院", "报销", "材料"]),
+    KnowledgeItem(id="faq_001", category="common_questions", title="感冒药能报销吗？",
+                  content="普通感冒药属于门诊用药，可以按照门诊报销政策进行报销。", tags=["感冒", "药品", "报销"]),
+]
+
+def linear_search(query, category=None, limit=10):
+    """原有的逐条遍历打分实现"""
+    query_lower = query.lower()
+    results = []
+    for item in ITEMS:
+        if category and item.category != category:
+            continue
+        score = 0
+        if query_lower in item.title.lower():
+            score += 3
+        if query_lower in item.content.lower():
+            score += 1
+        for tag in item.tags:
+            if query_lower in tag.lower():
+                score += 2
+        if score > 0:
+            results.append((item.id, score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:limit]
+
+def test_matches_linear_scoring():
+    """索引检索结果与逐条遍历一致"""
+    index = KnowledgeSearchIndex(ITEMS)
+    for query in ["报销", "门诊", "住院", "感冒药能报销吗？", "比例为8", "不存在"]:
+        for category in [None, "policy"]:
+            assert index.search(query, category, limit=10) == linear_search(query, category, limit=10)
+
+def test_limit_and_empty_index():
+    """返回数量限制与空索引"""
+    index = KnowledgeSearchIndex(ITEMS)
+    assert len(index.search("报销", limit=2)) == 2
+    assert KnowledgeSearchIndex([]).search("报销") == []
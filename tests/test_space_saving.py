@@ -0,0 +1,26 @@
+"""
+Space-Saving高频项统计测试
+"""
+from collections import Counter
+
+from src.core.stats.space_saving import SpaceSaving
+
+def test_exact_when_under_capacity():
+    """不同元素数不超过k时与Counter.most_common结果一致"""
+    items = [f"agent-{i % 10}" for i in range(200)] + ["agent-3"] * 7 + ["agent-8"] * 2
+    sketch = SpaceSaving(k=16)
+    for item in items:
+        sketch.add(item)
+    assert sketch.top(5) == Counter(items).most_common(5)
+
+def test_bounded_and_keeps_heavy_hitters():
+    """大量不同元素时槽位数不超过k，高频元素仍排在前列"""
+    sketch = SpaceSaving(k=8)
+    for i in range(5000):
+        sketch.add(f"rare-{i}")
+        if i % 2 == 0:
+            sketch.add("browser")
+        if i % 5 == 0:
+            sketch.add("crawler")
+    assert len(sketch) == 8
+    assert [item for item, _ in sketch.top(2)] == ["browser", "crawler"]